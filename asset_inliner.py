@@ -0,0 +1,122 @@
+import asyncio
+import base64
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from loguru import logger
+
+ImageFetcher = Callable[[str, float], Awaitable[Tuple[bytes, str]]]
+
+# 图片下载失败或超时时使用的占位图 (240x180灰色背景)
+PLACEHOLDER_IMAGE = "data:image/svg+xml;base64," + base64.b64encode(
+    b'<svg xmlns="http://www.w3.org/2000/svg" width="240" height="180">'
+    b'<rect width="100%" height="100%" fill="#dcdcdc"/></svg>'
+).decode("ascii")
+
+
+class ImageInliner:
+    """并发预取新闻配图并转换为data URI，渲染时无需再访问网络"""
+
+    def __init__(self, fetcher: ImageFetcher, timeout: float = 3, max_image_bytes: int = 1024 * 1024,
+                 max_cache_bytes: int = 32 * 1024 * 1024):
+        self.fetcher = fetcher
+        self.timeout = timeout
+        self.max_image_bytes = max_image_bytes
+        self.max_cache_bytes = max_cache_bytes
+        self._blobs: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def configure(self, timeout: float, max_image_bytes: int, max_cache_bytes: int):
+        self.timeout = timeout
+        self.max_image_bytes = max_image_bytes
+        self.max_cache_bytes = max_cache_bytes
+        self._evict()
+
+    async def inline(self, newslist: List[Dict[str, Any]], field: str = "picUrl") -> Tuple[List[Dict[str, Any]], bool]:
+        """返回(配图已替换为data URI的新闻列表副本, 是否所有配图都下载成功)，原列表不变"""
+        urls = [news.get(field, "") for news in newslist]
+        results = await asyncio.gather(*(self.get_data_uri(url) for url in urls))
+        inlined = []
+        for news, (data_uri, _) in zip(newslist, results):
+            news = dict(news)
+            news[field] = data_uri
+            inlined.append(news)
+        return inlined, all(ok for _, ok in results)
+
+    async def get_data_uri(self, url: str) -> Tuple[str, bool]:
+        """获取单张图片的data URI，返回(data URI, 是否成功)；下载失败或超过时限时返回占位图和False
+
+        没有配图或链接无效时同样使用占位图，但重试也不会有变化，因此视为成功。
+        """
+        if not url or url.startswith("data:"):
+            return url or PLACEHOLDER_IMAGE, True
+        if not url.startswith(("http://", "https://")):
+            return PLACEHOLDER_IMAGE, True
+
+        cached = self._blobs.get(url)
+        if cached is not None:
+            self._blobs.move_to_end(url)
+            self.hits += 1
+            return cached, True
+
+        self.misses += 1
+        future = self._inflight.get(url)
+        if future is None:
+            future = asyncio.ensure_future(self._download(url))
+            self._inflight[url] = future
+            future.add_done_callback(lambda done: self._on_download_done(url, done))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout), True
+        except asyncio.TimeoutError:
+            self.failures += 1
+            logger.warning(f"[{self.__class__.__name__}] 下载配图超时，使用占位图: {url}")
+            return PLACEHOLDER_IMAGE, False
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"[{self.__class__.__name__}] 下载配图失败，使用占位图: {url} ({e})")
+            return PLACEHOLDER_IMAGE, False
+
+    def _on_download_done(self, url: str, future: asyncio.Future):
+        self._inflight.pop(url, None)
+        if not future.cancelled():
+            # 所有等待者都已超时时，避免出现"exception was never retrieved"
+            future.exception()
+
+    async def _download(self, url: str) -> str:
+        data, content_type = await self.fetcher(url, self.timeout)
+        content_type = (content_type or "").split(";")[0].strip().lower()
+        if not content_type.startswith("image/"):
+            raise ValueError(f"不是图片: {content_type or '未知类型'}")
+        if len(data) > self.max_image_bytes:
+            raise ValueError(f"图片过大: {len(data)} 字节")
+        data_uri = f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+        self._put(url, data_uri)
+        return data_uri
+
+    def _put(self, url: str, data_uri: str):
+        if len(data_uri) > self.max_cache_bytes:
+            return
+        old = self._blobs.pop(url, None)
+        if old is not None:
+            self._size -= len(old)
+        self._blobs[url] = data_uri
+        self._size += len(data_uri)
+        self._evict()
+
+    def _evict(self):
+        while self._blobs and self._size > self.max_cache_bytes:
+            _, data_uri = self._blobs.popitem(last=False)
+            self._size -= len(data_uri)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._blobs),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+        }
@@ -0,0 +1,88 @@
+"""命令分发基准：向handle_text输入大量模拟群聊消息，统计每秒处理的消息数
+
+需要在XXXBot根目录下执行，以便导入框架模块：
+    python plugins/AIReport/benchmarks/bench_dispatch.py [--messages 200000] [--command-ratio 0.01]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_ROOT = os.path.dirname(os.path.dirname(PLUGIN_DIR))
+sys.path.insert(0, BOT_ROOT)
+
+from loguru import logger  # noqa: E402
+
+PLUGIN_MODULE = f"plugins.{os.path.basename(PLUGIN_DIR)}.main"
+
+CHAT_SAMPLES = [
+    "哈哈哈",
+    "今天中午吃什么？",
+    "[图片]",
+    "收到",
+    "明天几点开会，有人知道吗",
+    "这个AI工具挺好用的，推荐大家试试",
+    "老金你好",
+    "https://example.com/some/very/long/link?with=query&and=more",
+    "好的👌",
+    "刚看了一篇关于大模型推理优化的长文，里面提到KV cache压缩和投机解码能把延迟降低一半以上，感兴趣的可以私聊我要链接" * 3,
+]
+COMMAND_SAMPLES = ["AI简讯", "ai快讯", "老金 AI资讯", "老金，AI简讯", "ＡＩ快讯"]
+
+
+class NullBot:
+    """不做任何事情的bot客户端"""
+
+    async def send_text_message(self, *args, **kwargs):
+        return None
+
+
+def build_stream(count, command_ratio, seed=42):
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        content = rng.choice(COMMAND_SAMPLES) if rng.random() < command_ratio else rng.choice(CHAT_SAMPLES)
+        messages.append({"Content": content, "FromWxid": f"group{i % 200}@chatroom", "SenderWxid": f"wxid_{i % 5000}"})
+    return messages
+
+
+async def run(messages):
+    import importlib
+    plugin = importlib.import_module(PLUGIN_MODULE).AIReport()
+    plugin.enable = True
+    plugin.api_key = plugin.api_key or "bench"
+    plugin.rate_limit_enable = False
+    matched = []
+
+    async def record(command, bot, conversation_id, arg="", send_wait=True):
+        matched.append(command)
+
+    # 只测分发本身，不实际获取和发送资讯
+    plugin._process_request = record
+    bot = NullBot()
+
+    start = time.perf_counter()
+    for message in messages:
+        await plugin.handle_text(bot, message)
+    await asyncio.gather(*plugin._report_tasks)
+    return time.perf_counter() - start, len(matched)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--command-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+
+    logger.remove()
+    messages = build_stream(args.messages, args.command_ratio)
+    elapsed, matched = asyncio.run(run(messages))
+    print(f"消息数: {len(messages)}  命中命令: {matched}")
+    print(f"总耗时: {elapsed:.3f}s  吞吐: {len(messages) / elapsed:,.0f} 条/秒  平均: {elapsed / len(messages) * 1e6:.2f} us/条")
+
+
+if __name__ == "__main__":
+    main()
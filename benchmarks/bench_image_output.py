@@ -0,0 +1,84 @@
+"""图片输出基准：对比不同格式、质量、裁剪方式和像素比下的渲染耗时与图片大小
+
+需要安装Playwright和Chromium，在插件目录下执行：
+    python benchmarks/bench_image_output.py [--repeat 5] [--news 6]
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import statistics
+import sys
+import time
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PACKAGE = os.path.basename(PLUGIN_DIR)
+
+from loguru import logger  # noqa: E402
+
+render_worker = importlib.import_module(f"{PACKAGE}.render_worker")
+template_engine = importlib.import_module(f"{PACKAGE}.template_engine")
+asset_inliner = importlib.import_module(f"{PACKAGE}.asset_inliner")
+
+# (名称, 格式, 质量, 像素比, 裁剪选择器)
+MODES = [
+    ("png 整页(旧)", "png", 100, 1.0, ""),
+    ("png 裁剪", "png", 100, 1.0, ".card"),
+    ("jpeg q85 裁剪", "jpeg", 85, 1.0, ".card"),
+    ("jpeg q70 裁剪", "jpeg", 70, 1.0, ".card"),
+    ("webp q80 裁剪", "webp", 80, 1.0, ".card"),
+    ("jpeg q85 2x", "jpeg", 85, 2.0, ".card"),
+]
+
+
+def make_newslist(size):
+    return [
+        {
+            "title": f"第{i + 1}条AI新闻：大模型推理能力再创新高",
+            "description": "这是一段新闻简介，用于测试图片渲染的输出大小和耗时。" * 4,
+            "ctime": "2026-10-18 09:00",
+            "picUrl": asset_inliner.PLACEHOLDER_IMAGE,
+        }
+        for i in range(size)
+    ]
+
+
+async def run(repeat, news_count):
+    template = template_engine.NewsTemplate(
+        os.path.join(PLUGIN_DIR, "news_template.html"), os.path.join(PLUGIN_DIR, "QRcode.png"))
+    shell = template.shell()
+    news_html = template.render_units(make_newslist(news_count))
+
+    worker = render_worker.RenderWorker(concurrency=1, font_dir=os.path.join(PLUGIN_DIR, "fonts"))
+    if not await worker.start(shell):
+        print("浏览器启动失败，请确认已安装playwright和chromium")
+        return
+    try:
+        print(f"{'模式':<16} {'实际格式':>8} {'平均耗时(ms)':>14} {'p95(ms)':>10} {'大小(KB)':>10}")
+        for name, image_format, quality, scale, clip in MODES:
+            worker.configure_output(image_format=image_format, quality=quality, scale=scale, clip_selector=clip)
+            data = await worker.render(shell, news_html)  # 预热，像素比变化时会重建页面
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = await worker.render(shell, news_html)
+                timings.append((time.perf_counter() - start) * 1000)
+            p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+            print(f"{name:<16} {worker.image_format:>8} {statistics.mean(timings):>14.1f} {p95:>10.1f} {len(data) / 1024:>10.1f}")
+    finally:
+        await worker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--news", type=int, default=6)
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    asyncio.run(run(args.repeat, args.news))
+
+
+if __name__ == "__main__":
+    main()
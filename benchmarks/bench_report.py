@@ -0,0 +1,307 @@
+"""端到端基准：用本地模拟的天行API和记录发送内容的bot客户端驱动handle_text
+
+不需要API Key和微信客户端。需要在XXXBot根目录下执行，以便导入框架模块：
+    python plugins/AIReport/benchmarks/bench_report.py burst --requests 20
+    python plugins/AIReport/benchmarks/bench_report.py text-rate --rate 20 --duration 10
+    python plugins/AIReport/benchmarks/bench_report.py cold-warm --engine browser --mode process
+
+场景：
+    burst       同时发起N个图片请求(每个来自不同会话)
+    text-rate   按固定速率持续发起文字请求
+    cold-warm   浏览器冷启动后的第一个图片请求与之后的请求对比
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_ROOT = os.path.dirname(os.path.dirname(PLUGIN_DIR))
+sys.path.insert(0, BOT_ROOT)
+
+from aiohttp import web  # noqa: E402
+from loguru import logger  # noqa: E402
+
+PACKAGE = f"plugins.{os.path.basename(PLUGIN_DIR)}"
+API_PATH = "/ai/index"
+
+
+class RecordingBot:
+    """记录所有发送内容的bot客户端，可以模拟发送耗时"""
+
+    def __init__(self, send_latency=0.0):
+        self.send_latency = send_latency
+        self.texts = []
+        self.images = []
+
+    async def send_text_message(self, conversation_id, content, *args, **kwargs):
+        await asyncio.sleep(self.send_latency)
+        self.texts.append((time.perf_counter(), conversation_id, content))
+
+    async def send_image(self, conversation_id, image, *args, **kwargs):
+        await asyncio.sleep(self.send_latency)
+        self.images.append((time.perf_counter(), conversation_id, len(image)))
+
+
+class FakeTianApi:
+    """模拟天行API /ai/index 的本地HTTP服务，同时提供新闻配图"""
+
+    def __init__(self, latency=0.05, fail_rate=0.0, news=20, seed=42):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.news = news
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.image_calls = 0
+        self._image = self._make_image()
+        self._runner = None
+        self.base_url = ""
+
+    @staticmethod
+    def _make_image():
+        try:
+            from PIL import Image
+        except ImportError:
+            return b""
+        buffer = BytesIO()
+        Image.new("RGB", (800, 450), (120, 140, 180)).save(buffer, format="JPEG", quality=80)
+        return buffer.getvalue()
+
+    def newslist(self, num):
+        return [
+            {
+                "id": f"bench{i}",
+                "ctime": "2026-10-18 09:00",
+                "title": f"第{i + 1}条AI新闻：大模型推理能力再创新高",
+                "description": "这是一段新闻简介，用于测试端到端的处理耗时和吞吐。" * 3,
+                "source": "bench",
+                "picUrl": f"{self.base_url}/img/{i}.jpg" if self._image else "",
+                "url": f"https://example.com/news/{i}",
+            }
+            for i in range(min(num, self.news))
+        ]
+
+    async def _handle_news(self, request):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < self.fail_rate:
+            self.failures += 1
+            return web.Response(status=500, text="internal error")
+        num = int(request.query.get("num", 10))
+        return web.json_response({"code": 200, "msg": "success", "result": {"newslist": self.newslist(num)}})
+
+    async def _handle_image(self, request):
+        self.image_calls += 1
+        await asyncio.sleep(self.latency)
+        return web.Response(body=self._image, content_type="image/jpeg")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(API_PATH, self._handle_news)
+        app.router.add_get("/img/{name}", self._handle_image)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class RssSampler:
+    """定期统计本进程及子进程(Chromium、渲染工作进程)的内存，记录峰值"""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = 0
+        self._task = None
+        self._process_tree_rss = importlib.import_module(f"{PACKAGE}.render_service").process_tree_rss
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self.peak = max(self.peak, await loop.run_in_executor(None, self._process_tree_rss, os.getpid()))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(name, latencies, failures, elapsed, rss):
+    count = len(latencies) + failures
+    return {
+        "scenario": name,
+        "requests": count,
+        "failed": failures,
+        "duration": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "mean": statistics.mean(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies, default=0.0),
+        "peak_rss_mb": rss / 1024 / 1024,
+    }
+
+
+def make_plugin(args, api, store_dir):
+    plugin = importlib.import_module(f"{PACKAGE}.main").AIReport()
+    # 模拟数据写入临时新闻库，不污染插件目录下的news.db
+    plugin.news_store.configure(os.path.join(store_dir, "news.db"), plugin.news_store.max_items)
+    plugin.enable = True
+    plugin.api_key = "bench"
+    plugin.api_endpoint = api.base_url + API_PATH
+    plugin._configure_sources()
+    plugin.rate_limit_enable = False
+    plugin.image_cache_enable = args.image_cache
+    plugin.news_cache.configure(args.news_ttl, args.news_ttl * 3)
+    plugin.render_engine = args.engine
+    plugin.render_mode = args.mode
+    plugin._select_render_worker()
+    plugin.render_worker.configure(concurrency=args.concurrency, queue_size=args.requests)
+    if args.mode == "process":
+        plugin.render_worker.configure_pool(processes=args.processes, max_rss_mb=0, max_jobs=0)
+    return plugin
+
+
+async def request(plugin, bot, command, conversation_id):
+    """模拟一条群消息，等待该请求在后台处理完成，返回耗时；失败时返回None"""
+    start = time.perf_counter()
+    await plugin.handle_text(bot, {"Content": command, "FromWxid": conversation_id})
+    task = plugin._pending_requests.get((conversation_id,) + plugin._parse_command(command))
+    if task is not None:
+        await task
+    elapsed = time.perf_counter() - start
+    if command == "AI快讯":
+        delivered = any(cid == conversation_id for _, cid, _ in bot.images)
+    else:
+        delivered = any(cid == conversation_id and text.startswith("📢") for _, cid, text in bot.texts)
+    return elapsed if delivered else None
+
+
+async def scenario_burst(plugin, bot, args):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        request(plugin, bot, "AI快讯", f"burst{i}@chatroom") for i in range(args.requests)
+    ))
+    return [r for r in results if r is not None], results.count(None), time.perf_counter() - start
+
+
+async def scenario_text_rate(plugin, bot, args):
+    tasks = []
+    start = time.perf_counter()
+    total = int(args.rate * args.duration)
+    for i in range(total):
+        # 按计划时间发出，不受前面请求耗时影响
+        delay = start + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(request(plugin, bot, "AI简讯", f"text{i}@chatroom")))
+    results = await asyncio.gather(*tasks)
+    return [r for r in results if r is not None], results.count(None), time.perf_counter() - start
+
+
+async def scenario_cold_warm(plugin, bot, args):
+    await plugin._cleanup_playwright()
+    start = time.perf_counter()
+    cold = await request(plugin, bot, "AI快讯", "cold@chatroom")
+    warm = []
+    for i in range(args.requests):
+        warm.append(await request(plugin, bot, "AI快讯", f"warm{i}@chatroom"))
+    elapsed = time.perf_counter() - start
+    print(f"冷启动: {cold if cold is None else f'{cold * 1000:.0f}ms'}")
+    return [r for r in warm if r is not None], warm.count(None) + (cold is None), elapsed
+
+
+SCENARIOS = {
+    "burst": scenario_burst,
+    "text-rate": scenario_text_rate,
+    "cold-warm": scenario_cold_warm,
+}
+
+
+async def run(args):
+    api = FakeTianApi(latency=args.api_latency, fail_rate=args.fail_rate)
+    await api.start()
+    with tempfile.TemporaryDirectory(prefix="aireport-bench-") as store_dir:
+        plugin = make_plugin(args, api, store_dir)
+        bot = RecordingBot(send_latency=args.send_latency)
+        sampler = RssSampler()
+        sampler.start()
+        try:
+            latencies, failures, elapsed = await SCENARIOS[args.scenario](plugin, bot, args)
+        finally:
+            await sampler.stop()
+            await plugin.on_disable()
+            await api.stop()
+
+    result = summarize(args.scenario, latencies, failures, elapsed, sampler.peak)
+    result["api_calls"] = api.calls
+    result["api_failures"] = api.failures
+    result["stages"] = plugin.get_metrics()["stages"]
+    return result
+
+
+def print_result(result):
+    print(f"场景: {result['scenario']}  请求: {result['requests']}  失败: {result['failed']}  "
+          f"API调用: {result['api_calls']} (失败{result['api_failures']})")
+    print(f"总耗时: {result['duration']:.2f}s  吞吐: {result['throughput']:.2f} 请求/秒  峰值内存: {result['peak_rss_mb']:.0f}MB")
+    print(f"延迟(ms)  mean {result['mean'] * 1000:8.1f}  p50 {result['p50'] * 1000:8.1f}  "
+          f"p95 {result['p95'] * 1000:8.1f}  p99 {result['p99'] * 1000:8.1f}  max {result['max'] * 1000:8.1f}")
+    print(f"{'阶段':<16}{'次数':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}")
+    for stage, summary in sorted(result["stages"].items(), key=lambda item: -item[1]["p99"]):
+        print(f"{stage:<16}{summary['count']:>8}{summary['p50'] * 1000:>12.2f}"
+              f"{summary['p95'] * 1000:>12.2f}{summary['p99'] * 1000:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=20, help="burst的并发数，cold-warm的热请求数")
+    parser.add_argument("--rate", type=float, default=20, help="text-rate每秒请求数")
+    parser.add_argument("--duration", type=float, default=10, help="text-rate持续时间(秒)")
+    parser.add_argument("--engine", choices=["browser", "pillow"], default="browser")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=2, help="每个浏览器同时渲染的页面数")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="模拟API和配图下载的延迟(秒)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="模拟API返回500的比例")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="模拟发送消息的耗时(秒)")
+    parser.add_argument("--news-ttl", type=float, default=600, help="新闻缓存时间，0表示每次都请求API")
+    parser.add_argument("--image-cache", action="store_true", help="开启图片缓存(默认关闭，以便测量渲染)")
+    parser.add_argument("--json", action="store_true", help="以JSON输出，便于对比不同版本")
+    parser.add_argument("--verbose", action="store_true", help="输出插件日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_result(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""模板渲染微基准：对比每次读文件+字符串拼接的旧实现与预编译模板
+
+用法（在插件目录下执行）：
+    python benchmarks/bench_template.py [--repeat 200]
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PLUGIN_DIR)
+
+from template_engine import NewsTemplate  # noqa: E402
+
+TEMPLATE_PATH = os.path.join(PLUGIN_DIR, "news_template.html")
+QR_CODE_PATH = os.path.join(PLUGIN_DIR, "QRcode.png")
+SIZES = (1, 6, 10, 20, 50, 100)
+
+
+def make_newslist(size):
+    return [
+        {
+            "title": f"第{i}条AI新闻标题：大模型<推理>能力再创新高 & 更多",
+            "description": "这是一段新闻简介。" * 20,
+            "ctime": "2026-10-18 09:00",
+            "picUrl": f"https://example.com/images/{i}.jpg?w=240&h=180",
+        }
+        for i in range(size)
+    ]
+
+
+def legacy_render(newslist):
+    """改造前的_generate_html实现"""
+    with open(TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+        template = f.read()
+    with open(QR_CODE_PATH, 'rb') as image_file:
+        encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
+    template = template.replace("QRcode.png", f"data:image/png;base64,{encoded_string}")
+    news_units = ""
+    for news_item in newslist:
+        title = news_item.get('title', '未知标题')
+        description = news_item.get('description', '无描述')
+        if len(description) > 100:
+            description = description[:100] + '...'
+        ctime = news_item.get('ctime', '未知时间')
+        picUrl = news_item.get('picUrl', '')
+        news_units += f'''
+                <div class="news-unit">
+                    <img src="{picUrl}" alt="news image">
+                    <div class="text-block">
+                        <div class="title">{title}</div>
+                        <div class="description">{description}</div>
+                        <div class="ctime">{ctime}</div>
+                    </div>
+                </div>'''
+    return template.replace('<!-- NEWS_CONTENT -->', news_units)
+
+
+def timeit(func, newslist, repeat):
+    func(newslist)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(newslist)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    template = NewsTemplate(TEMPLATE_PATH, QR_CODE_PATH)
+    print(f"{'条数':>6} {'旧实现(us)':>12} {'预编译(us)':>12} {'仅新闻单元(us)':>16} {'加速比':>8}")
+    for size in SIZES:
+        newslist = make_newslist(size)
+        legacy = timeit(legacy_render, newslist, args.repeat)
+        compiled = timeit(template.render, newslist, args.repeat)
+        units = timeit(template.render_units, newslist, args.repeat)
+        print(f"{size:>6} {legacy:>12.1f} {compiled:>12.1f} {units:>16.1f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
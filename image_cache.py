@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+
+def make_image_key(newslist: List[Dict[str, Any]], fields: Iterable[str], versions: Iterable[Any]) -> str:
+    """根据模板用到的新闻字段和模板/资源文件版本生成缓存key"""
+    fields = list(fields)
+    payload = {
+        "news": [[str(news.get(field, "")) for field in fields] for news in newslist],
+        "versions": [str(v) for v in versions],
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """渲染结果缓存：内存LRU，可选磁盘目录，均按总字节数淘汰
+
+    磁盘读写和淘汰扫描在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 磁盘写入和淘汰扫描串行执行
+        self._disk_lock = threading.Lock()
+
+    def configure(self, max_bytes: int, disk_dir: Optional[str], max_disk_bytes: int):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._evict_memory()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+        data = None
+        if self.disk_dir:
+            data = await asyncio.get_running_loop().run_in_executor(None, self._read_disk, key)
+        if data is not None:
+            self.disk_hits += 1
+            self._put_memory(key, data)
+            return data
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        """写入内存后立即返回，磁盘写入在后台线程完成"""
+        if not data:
+            return
+        self._put_memory(key, data)
+        if self.disk_dir:
+            asyncio.get_running_loop().run_in_executor(None, self._write_disk, self.disk_dir, key, data)
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._entries[key] = data
+        self._size += len(data)
+        self._evict_memory()
+
+    def _evict_memory(self):
+        while self._entries and self._size > self.max_bytes:
+            _, data = self._entries.popitem(last=False)
+            self._size -= len(data)
+            self.evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = os.path.join(self.disk_dir, f"{key}.img")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # 更新访问时间，用于LRU淘汰
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[{self.__class__.__name__}] 读取磁盘缓存失败: {e}")
+            return None
+
+    def _write_disk(self, disk_dir: str, key: str, data: bytes):
+        path = os.path.join(disk_dir, f"{key}.img")
+        try:
+            with self._disk_lock:
+                os.makedirs(disk_dir, exist_ok=True)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._evict_disk(disk_dir)
+        except Exception as e:
+            logger.warning(f"[{self.__class__.__name__}] 写入磁盘缓存失败: {e}")
+
+    def _evict_disk(self, disk_dir: str):
+        files = []
+        total = 0
+        for entry in os.scandir(disk_dir):
+            if entry.is_file() and entry.name.endswith(".img"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
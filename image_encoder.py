@@ -0,0 +1,62 @@
+from io import BytesIO
+
+from loguru import logger
+
+SUPPORTED_FORMATS = ("png", "jpeg", "webp")
+QUALITY_STEP = 10
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def normalize_format(value: str) -> str:
+    """统一格式名称，不支持的格式回退为png"""
+    value = (value or "png").lower()
+    if value == "jpg":
+        value = "jpeg"
+    if value not in SUPPORTED_FORMATS:
+        logger.warning(f"[image_encoder] 不支持的图片格式 {value}，使用png")
+        return "png"
+    return value
+
+
+def quality_steps(quality: int, min_quality: int):
+    """从quality开始逐级降低，直到min_quality"""
+    quality = max(1, min(100, quality))
+    while True:
+        yield quality
+        if quality <= min_quality:
+            return
+        quality = max(min_quality, quality - QUALITY_STEP)
+
+
+def encode(image, image_format: str, quality: int = 85, min_quality: int = 40, max_bytes: int = 0) -> bytes:
+    """把Pillow图像编码为指定格式；设置max_bytes时逐级降低质量直到满足大小"""
+    if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    data = b""
+    for step in quality_steps(quality, min_quality):
+        buffer = BytesIO()
+        if image_format == "png":
+            image.save(buffer, format="PNG")
+        elif image_format == "webp":
+            image.save(buffer, format="WEBP", quality=step, method=4)
+        else:
+            image.save(buffer, format="JPEG", quality=step, progressive=True)
+        data = buffer.getvalue()
+        if image_format == "png" or not max_bytes or len(data) <= max_bytes:
+            break
+    return data
+
+
+def reencode(image_bytes: bytes, image_format: str, quality: int = 85, min_quality: int = 40, max_bytes: int = 0) -> bytes:
+    """用Pillow把图片重新编码为指定格式"""
+    from PIL import Image
+
+    with Image.open(BytesIO(image_bytes)) as image:
+        return encode(image, image_format, quality, min_quality, max_bytes)
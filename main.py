@@ -1,13 +1,12 @@
 import os
 import json
 import tomllib
-import requests
 from io import BytesIO
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import asyncio
-import threading
-import base64 # For QR code in HTML
 import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 
 from loguru import logger
 # 延迟导入playwright，避免启动时加载
@@ -17,6 +16,40 @@ from utils.plugin_base import PluginBase
 from utils.decorators import on_text_message
 from WechatAPI.Client import WechatAPIClient
 
+from .news_cache import NewsCache
+from .news_store import NewsStore
+from .asset_inliner import ImageInliner
+from .image_cache import ImageCache, make_image_key
+from .news_client import NewsApiClient, DEFAULT_QUOTA_CODES
+from .news_sources import NewsAggregator, TianApiSource, FeedSource, source_name
+from .rate_limit import RateLimiter, TokenBucket
+from .scheduler import DailyScheduler
+from .render_worker import RenderWorker, RenderQueueFull, DEFAULT_BROWSER_ARGS
+from .render_service import RenderService
+from .pil_renderer import PillowRenderer
+from .image_encoder import pillow_available
+from .template_engine import NewsTemplate
+from .metrics import Metrics, MetricsServer
+
+TEXT_COMMAND = "AI简讯"
+IMAGE_COMMAND = "AI快讯"
+RENDER_ENGINES = ("browser", "pillow")
+# thread：浏览器运行在插件进程的渲染线程中；process：运行在独立的工作进程中
+RENDER_MODES = {"thread": RenderWorker, "process": RenderService}
+BROWSER_WARMUP_MODES = ("none", "startup", "first_command")
+DEFAULT_TEXT_COMMANDS = ["AI简讯", "ai简讯"]
+DEFAULT_IMAGE_COMMANDS = ["AI快讯", "ai快讯", "AI资讯", "ai资讯"]
+# 去掉前缀后残留的分隔符
+PREFIX_SEPARATORS = " \t,，:：、"
+# 命令后的参数：数字为页码，以下词表示查看上次之后的新增资讯
+NEW_SINCE_ARGS = ("新", "new", "最新")
+
+
+def normalize_command(text: str) -> str:
+    """统一全角/半角和大小写，用于命令匹配"""
+    return unicodedata.normalize("NFKC", text).strip().casefold()
+
+
 class AIReport(PluginBase):
     description = "获取AI相关资讯，支持文字版和图片版"
     author = "老金"
@@ -30,16 +63,112 @@ class AIReport(PluginBase):
         self.image_news_count = 6
         self.api_endpoint = "https://apis.tianapi.com/ai/index"
         self.handler_priority = 20
+        self.prefixes = []
+        self.text_commands = list(DEFAULT_TEXT_COMMANDS)
+        self.image_commands = list(DEFAULT_IMAGE_COMMANDS)
+        self._compile_commands()
+        self.news_cache_ttl = 600
+        self.news_cache_stale_ttl = 1800
+        self.news_cache = NewsCache(self.news_cache_ttl, self.news_cache_stale_ttl)
+        # 文字版分段发送：单条消息不超过max_chars；stream时每条只放少量资讯，第一条尽快发出
+        self.text_max_chars = 2000
+        self.text_stream = False
+        self.text_stream_items = 5
+        # 新闻缓存未过期时不发送"请稍候"，直接回复资讯
+        self.text_skip_wait = True
+        # HTTP会话在首次请求时才创建
+        self.news_client = NewsApiClient()
+        # 新闻来源：API_ENDPOINT之外还可以配置其他天行API分类和RSS/Atom订阅，并发拉取后合并
+        self.source_deadline = 8
+        self.extra_endpoints = []
+        self.feeds = []
+        self.aggregator = NewsAggregator()
+        self._configure_sources()
+        # 本地新闻库：保存历史资讯，支持翻页和查看新增
+        self.store_enable = True
+        self.news_store = NewsStore(os.path.join(os.path.dirname(__file__), "news.db"))
+        # 新闻库操作本身是串行的，使用单独的线程，不与Pillow渲染等任务争用默认线程池；首次使用时创建
+        self._store_executor = None
         
-        # 将这些变量设为None但不初始化，实现真正的懒加载
-        self.browser = None
-        self.playwright_instance = None
-        self.is_initializing = False
-        self.playwright_lock = threading.Lock()
-        self.initialization_thread = None
+        # 常驻渲染线程，浏览器在首次需要时才启动，实现真正的懒加载
+        self.browser_args = list(DEFAULT_BROWSER_ARGS)
+        self.viewport_width = 700
+        self.viewport_height = 1380
+        self.render_concurrency = 2
+        self.render_queue_size = 8
+        self.render_timeout = 60
+        self.page_max_uses = 50
+        self.offline_render = True
+        self.font_dir = os.path.join(os.path.dirname(__file__), "fonts")
+        self.render_mode = "thread"
+        self.render_processes = 2
+        self.render_max_rss_mb = 1024
+        self.render_max_jobs = 200
+        # 浏览器预热时机：none在首次渲染时启动；startup在插件启动后；first_command在收到第一条命令时
+        self.browser_warmup = "none"
+        # 关闭时等待处理中的请求完成的最长时间(秒)
+        self.drain_timeout = 30
+        self._warmup_task = None
+        self.render_worker = RenderWorker(font_dir=self.font_dir)
+        self._retired_workers = set()
+        # 配置变更触发的后台任务，保留引用避免执行中被回收
+        self._background_tasks = set()
+
+        # 图片输出设置
+        self.image_format = "jpeg"
+        self.image_quality = 85
+        self.image_min_quality = 40
+        self.image_max_kb = 0
+        self.image_scale = 1.0
+        self.image_clip_selector = ".card"
+
+        # 渲染引擎：browser使用Playwright，pillow直接绘制；浏览器失败时按fallback回退
+        self.render_engine = "browser"
+        self.render_fallback = "pillow"
+        self.font_path = ""
+        self.pil_renderer = PillowRenderer(font_dir=self.font_dir)
+
+        # 新闻配图预取，渲染时不再访问网络
+        self.image_prefetch = True
+        self.image_inliner = ImageInliner(self.news_client.get_bytes)
+
+        # 渲染结果缓存
+        self.image_cache_enable = True
+        self.image_cache = ImageCache()
+        # 渲染中的图片，相同缓存key的请求等待同一次渲染
+        self._image_renders: Dict[str, asyncio.Future] = {}
+        self._report_tasks = set()
         
+        # 限流和同一会话的重复请求合并
+        self.rate_limit_enable = True
+        self.rate_limit_reply = "请求过于频繁，请稍后再试。"
+        self.rate_limiter = RateLimiter()
+        self._pending_requests = {}
+
+        # 群发设置
+        self.broadcast_concurrency = 5
+        self.broadcast_send_rate = 60
+        self.broadcast_max_retries = 2
+        self.broadcast_retry_delay = 2
+
+        # 定时预取新闻和预渲染图片
+        self.schedule_enable = False
+        self.schedule_prerender = True
+        self.scheduler = DailyScheduler(self._scheduled_refresh)
+
         # 设置模板路径
         self.template_path = os.path.join(os.path.dirname(__file__), "news_template.html")
+        self.qr_code_path = os.path.join(os.path.dirname(__file__), "QRcode.png")
+        self.news_template = NewsTemplate(self.template_path, self.qr_code_path)
+        self.pil_renderer.qr_code_path = self.qr_code_path
+        
+        # 指标：各阶段耗时和计数，可选通过HTTP以Prometheus格式导出
+        self.metrics = Metrics()
+        self.metrics_http_enable = False
+        self.metrics_host = "127.0.0.1"
+        self.metrics_port = 9464
+        self.metrics_server = MetricsServer(self.metrics, self.metrics_host, self.metrics_port)
+        self._register_metrics()
         
         # 只加载基本配置
         logger.info(f"[{self.__class__.__name__}] 初始化中 - 仅加载基本配置")
@@ -73,6 +202,188 @@ class AIReport(PluginBase):
             settings_config = config.get("settings", {})
             self.text_news_count = int(settings_config.get("text_news_count", 10))
             self.image_news_count = int(settings_config.get("image_news_count", 6))
+            self.prefixes = list(settings_config.get("prefixes", []))
+            self.text_commands = list(settings_config.get("text_commands", DEFAULT_TEXT_COMMANDS))
+            self.image_commands = list(settings_config.get("image_commands", DEFAULT_IMAGE_COMMANDS))
+            self._compile_commands()
+
+            # 从缓存配置加载
+            cache_config = config.get("cache", {})
+            self.news_cache_ttl = float(cache_config.get("news_ttl", 600))
+            self.news_cache_stale_ttl = float(cache_config.get("news_stale_ttl", 1800))
+            self.news_cache.configure(self.news_cache_ttl, self.news_cache_stale_ttl)
+
+            # 从新闻来源配置加载
+            sources_config = config.get("sources", {})
+            source_settings = (list(sources_config.get("tianapi_endpoints", [])), list(sources_config.get("feeds", [])))
+            if source_settings != (self.extra_endpoints, self.feeds):
+                # 来源变化后旧的合并结果不再适用
+                self.news_cache.clear()
+            self.extra_endpoints, self.feeds = source_settings
+            self.source_deadline = float(sources_config.get("deadline", 8))
+            self._configure_sources()
+
+            # 从文字版配置加载
+            text_config = config.get("text", {})
+            self.text_max_chars = max(200, int(text_config.get("max_chars", 2000)))
+            self.text_stream = text_config.get("stream", False)
+            self.text_stream_items = max(1, int(text_config.get("stream_items", 5)))
+            self.text_skip_wait = text_config.get("skip_wait_when_cached", True)
+
+            # 从新闻库配置加载
+            store_config = config.get("store", {})
+            self.store_enable = store_config.get("enable", True)
+            store_path = store_config.get("path", "news.db")
+            if not os.path.isabs(store_path):
+                store_path = os.path.join(os.path.dirname(__file__), store_path)
+            self.news_store.configure(store_path, int(store_config.get("max_items", 5000)))
+
+            # 从HTTP配置加载
+            http_config = config.get("http", {})
+            self.news_client.configure(
+                connect_timeout=float(http_config.get("connect_timeout", 5)),
+                read_timeout=float(http_config.get("read_timeout", 10)),
+                max_retries=int(http_config.get("max_retries", 2)),
+                backoff_base=float(http_config.get("backoff_base", 0.5)),
+                quota_codes=http_config.get("quota_codes", DEFAULT_QUOTA_CODES),
+                breaker_cooldown=float(http_config.get("breaker_cooldown", 600)),
+            )
+
+            # 从浏览器配置加载
+            browser_config = config.get("browser", {})
+            self.browser_args = list(browser_config.get("browser_args", DEFAULT_BROWSER_ARGS))
+            self.viewport_width = int(browser_config.get("viewport_width", 700))
+            self.viewport_height = int(browser_config.get("viewport_height", 1380))
+            self.render_concurrency = int(browser_config.get("concurrency", 2))
+            self.render_queue_size = int(browser_config.get("queue_size", 8))
+            self.render_timeout = float(browser_config.get("job_timeout", 60))
+            self.page_max_uses = int(browser_config.get("page_max_uses", 50))
+            self.render_mode = browser_config.get("mode", "thread")
+            if self.render_mode not in RENDER_MODES:
+                logger.warning(f"[{self.__class__.__name__}] 不支持的渲染模式 {self.render_mode}，使用thread")
+                self.render_mode = "thread"
+            self.render_processes = int(browser_config.get("processes", 2))
+            self.render_max_rss_mb = float(browser_config.get("max_rss_mb", 1024))
+            self.render_max_jobs = int(browser_config.get("max_jobs", 200))
+            self.browser_warmup = browser_config.get("warmup", "none")
+            if self.browser_warmup not in BROWSER_WARMUP_MODES:
+                logger.warning(f"[{self.__class__.__name__}] 不支持的预热方式 {self.browser_warmup}，使用none")
+                self.browser_warmup = "none"
+            self.drain_timeout = float(browser_config.get("drain_timeout", 30))
+            self._select_render_worker()
+
+            # 从图片输出配置加载
+            image_config = config.get("image", {})
+            self.image_format = image_config.get("format", "jpeg")
+            self.image_quality = int(image_config.get("quality", 85))
+            self.image_min_quality = int(image_config.get("min_quality", 40))
+            self.image_max_kb = float(image_config.get("max_kb", 0))
+            self.image_scale = float(image_config.get("device_scale_factor", 1.0))
+            self.image_clip_selector = image_config.get("clip_selector", ".card")
+            self.render_worker.configure_output(
+                image_format=self.image_format,
+                quality=self.image_quality,
+                min_quality=self.image_min_quality,
+                max_bytes=int(self.image_max_kb * 1024),
+                scale=self.image_scale,
+                clip_selector=self.image_clip_selector,
+            )
+
+            # 从资源配置加载
+            assets_config = config.get("assets", {})
+            self.offline_render = assets_config.get("offline", True)
+            font_dir = assets_config.get("font_dir", "fonts")
+            if not os.path.isabs(font_dir):
+                font_dir = os.path.join(os.path.dirname(__file__), font_dir)
+            self.font_dir = font_dir
+            self.image_prefetch = assets_config.get("image_prefetch", True)
+            self.image_inliner.configure(
+                timeout=float(assets_config.get("image_timeout", 3)),
+                max_image_bytes=int(float(assets_config.get("image_max_kb", 1024)) * 1024),
+                max_cache_bytes=int(float(assets_config.get("image_cache_mb", 32)) * 1024 * 1024),
+            )
+            self.render_worker.configure(
+                browser_args=self.browser_args,
+                viewport={"width": self.viewport_width, "height": self.viewport_height},
+                concurrency=self.render_concurrency,
+                queue_size=self.render_queue_size,
+                job_timeout=self.render_timeout,
+                page_max_uses=self.page_max_uses,
+                offline=self.offline_render,
+                font_dir=self.font_dir,
+            )
+            if isinstance(self.render_worker, RenderService):
+                self.render_worker.configure_pool(
+                    processes=self.render_processes,
+                    max_rss_mb=self.render_max_rss_mb,
+                    max_jobs=self.render_max_jobs,
+                )
+
+            # 从渲染引擎配置加载
+            render_config = config.get("render", {})
+            self.render_engine = render_config.get("engine", "browser")
+            if self.render_engine not in RENDER_ENGINES:
+                logger.warning(f"[{self.__class__.__name__}] 不支持的渲染引擎 {self.render_engine}，使用browser")
+                self.render_engine = "browser"
+            self.render_fallback = render_config.get("fallback", "pillow")
+            self.font_path = render_config.get("font_path", "")
+            if self.font_path and not os.path.isabs(self.font_path):
+                self.font_path = os.path.join(os.path.dirname(__file__), self.font_path)
+            self.pil_renderer.configure(
+                width=self.viewport_width,
+                scale=self.image_scale,
+                font_path=self.font_path,
+                font_dir=self.font_dir,
+            )
+            self.pil_renderer.configure_output(
+                image_format=self.image_format,
+                quality=self.image_quality,
+                min_quality=self.image_min_quality,
+                max_bytes=int(self.image_max_kb * 1024),
+            )
+
+            # 从图片缓存配置加载
+            image_cache_config = config.get("image_cache", {})
+            self.image_cache_enable = image_cache_config.get("enable", True)
+            disk_dir = image_cache_config.get("disk_dir", "")
+            if disk_dir and not os.path.isabs(disk_dir):
+                disk_dir = os.path.join(os.path.dirname(__file__), disk_dir)
+            self.image_cache.configure(
+                max_bytes=int(float(image_cache_config.get("max_memory_mb", 64)) * 1024 * 1024),
+                disk_dir=disk_dir or None,
+                max_disk_bytes=int(float(image_cache_config.get("max_disk_mb", 256)) * 1024 * 1024),
+            )
+
+            # 从限流配置加载
+            rate_limit_config = config.get("rate_limit", {})
+            self.rate_limit_enable = rate_limit_config.get("enable", True)
+            self.rate_limit_reply = rate_limit_config.get("reply", "请求过于频繁，请稍后再试。")
+            self.rate_limiter.configure(
+                conversation_rate=float(rate_limit_config.get("conversation_rate", 3)),
+                conversation_burst=float(rate_limit_config.get("conversation_burst", 2)),
+                global_rate=float(rate_limit_config.get("global_rate", 30)),
+                global_burst=float(rate_limit_config.get("global_burst", 10)),
+            )
+
+            # 从群发配置加载
+            broadcast_config = config.get("broadcast", {})
+            self.broadcast_concurrency = max(1, int(broadcast_config.get("concurrency", 5)))
+            self.broadcast_send_rate = float(broadcast_config.get("send_rate", 60))
+            self.broadcast_max_retries = int(broadcast_config.get("max_retries", 2))
+            self.broadcast_retry_delay = float(broadcast_config.get("retry_delay", 2))
+
+            # 从定时任务配置加载
+            schedule_config = config.get("schedule", {})
+            self.schedule_enable = schedule_config.get("enable", False)
+            self.schedule_prerender = schedule_config.get("prerender", True)
+            self.scheduler.configure(schedule_config.get("refresh_times", []))
+
+            # 从指标配置加载
+            metrics_config = config.get("metrics", {})
+            self.metrics.enabled = metrics_config.get("enable", True)
+            self.metrics_http_enable = metrics_config.get("http_enable", False)
+            self.metrics_host = metrics_config.get("host", "127.0.0.1")
+            self.metrics_port = int(metrics_config.get("port", 9464))
 
             if not self.api_key or self.api_key == "YOUR_TIAN_API_KEY_HERE" or self.api_key == "":
                 logger.warning(f"[{self.__class__.__name__}] TIAN_API_KEY 未配置或无效")
@@ -99,6 +410,160 @@ class AIReport(PluginBase):
             "text_news_count = 10\n"
             "# 图片版新闻条数\n"
             "image_news_count = 6\n"
+            "# 命令前缀词列表 (如果消息以这些词开头，会被移除后再匹配命令)\n"
+            'prefixes = ["老金", "小金"]\n'
+            "# 简讯命令关键词\n"
+            'text_commands = ["AI简讯", "ai简讯"]\n'
+            "# 快讯命令关键词\n"
+            'image_commands = ["AI快讯", "ai快讯", "AI资讯", "ai资讯"]\n\n'
+            "[cache]\n"
+            "# 新闻数据缓存时间(秒)，0表示不缓存\n"
+            "news_ttl = 600\n"
+            "# 缓存过期后仍可返回旧数据并在后台刷新的时间(秒)\n"
+            "news_stale_ttl = 1800\n\n"
+            "[sources]\n"
+            "# 除API_ENDPOINT外的其他天行API新闻接口，与主接口使用同一个KEY\n"
+            "tianapi_endpoints = []\n"
+            "# RSS/Atom订阅，可以是URL或本地文件路径(相对路径相对于插件目录)\n"
+            "feeds = []\n"
+            "# 所有来源的总时限(秒)，超时未返回的来源本次跳过；只有一个来源时不限制\n"
+            "deadline = 8\n\n"
+            "[text]\n"
+            "# 文字版单条消息的最大字数，超出时按资讯拆分为多条发送\n"
+            "max_chars = 2000\n"
+            "# 是否分段发送：每条消息只包含stream_items条资讯，第一条尽快发出\n"
+            "stream = false\n"
+            "# 分段发送时每条消息包含的资讯条数\n"
+            "stream_items = 5\n"
+            "# 新闻缓存未过期时不发送\"请稍候\"，直接回复资讯\n"
+            "skip_wait_when_cached = true\n\n"
+            "[store]\n"
+            "# 是否把获取到的资讯保存到本地SQLite新闻库，开启后支持\"AI简讯 2\"翻页和\"AI简讯 新\"查看新增\n"
+            "enable = true\n"
+            "# 新闻库文件，相对路径相对于插件目录\n"
+            'path = "news.db"\n'
+            "# 最多保存的资讯条数，超出后删除最早的\n"
+            "max_items = 5000\n\n"
+            "[http]\n"
+            "# 建立连接超时时间(秒)\n"
+            "connect_timeout = 5\n"
+            "# 读取响应超时时间(秒)\n"
+            "read_timeout = 10\n"
+            "# 网络错误或服务端错误时的重试次数\n"
+            "max_retries = 2\n"
+            "# 重试退避基准时间(秒)，每次重试翻倍并加入随机抖动\n"
+            "backoff_base = 0.5\n"
+            "# 表示配额耗尽的API返回码，收到后暂停调用API\n"
+            "quota_codes = [130, 150]\n"
+            "# 配额耗尽后暂停调用的时间(秒)\n"
+            "breaker_cooldown = 600\n\n"
+            "[browser]\n"
+            "# 浏览器启动参数\n"
+            'browser_args = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-gpu"]\n'
+            "# 视口宽度\n"
+            "viewport_width = 700\n"
+            "# 视口高度\n"
+            "viewport_height = 1380\n"
+            "# 同时渲染的页面数\n"
+            "concurrency = 2\n"
+            "# 等待渲染的最大排队数，超出后直接提示繁忙\n"
+            "queue_size = 8\n"
+            "# 单次渲染超时时间(秒)\n"
+            "job_timeout = 60\n"
+            "# 页面使用多少次后回收重建，限制Chromium内存增长\n"
+            "page_max_uses = 50\n"
+            "# 渲染模式：thread在插件进程的渲染线程中运行浏览器；process在独立的工作进程中运行，浏览器崩溃或卡死不影响机器人\n"
+            'mode = "thread"\n'
+            "# process模式下的工作进程数，每个进程同时渲染concurrency个页面\n"
+            "processes = 2\n"
+            "# 工作进程(含Chromium)内存超过该值(MB)后回收重启，0表示不限制\n"
+            "max_rss_mb = 1024\n"
+            "# 工作进程完成多少个任务后回收重启，0表示不限制\n"
+            "max_jobs = 200\n"
+            "# 浏览器预热时机：none在首次渲染时启动；startup在插件启动后于后台启动；first_command在收到第一条命令时启动\n"
+            'warmup = "none"\n'
+            "# 关闭插件时等待处理中的请求和渲染完成的最长时间(秒)\n"
+            "drain_timeout = 30\n\n"
+            "[image]\n"
+            "# 输出格式：jpeg、webp(需要安装Pillow)或png\n"
+            'format = "jpeg"\n'
+            "# 图片质量(1-100)，png格式忽略\n"
+            "quality = 85\n"
+            "# 设备像素比，大于1时图片更清晰但体积更大\n"
+            "device_scale_factor = 1.0\n"
+            "# 只截取该元素所在区域，留空则截取整个页面\n"
+            'clip_selector = ".card"\n'
+            "# 图片大小上限(KB)，超过时逐级降低质量，0表示不限制\n"
+            "max_kb = 0\n"
+            "# 降低质量时的最低质量\n"
+            "min_quality = 40\n\n"
+            "[render]\n"
+            "# 渲染引擎：browser使用Playwright渲染HTML模板，pillow直接绘制(需要安装Pillow，无需浏览器)\n"
+            'engine = "browser"\n'
+            "# 浏览器渲染失败时的回退方式：pillow或text\n"
+            'fallback = "pillow"\n'
+            "# pillow引擎使用的中文字体文件，留空则依次查找font_dir和系统字体\n"
+            'font_path = ""\n\n'
+            "[image_cache]\n"
+            "# 是否缓存渲染好的图片，新闻内容相同时直接发送缓存\n"
+            "enable = true\n"
+            "# 内存缓存上限(MB)\n"
+            "max_memory_mb = 64\n"
+            "# 磁盘缓存目录，留空则只使用内存缓存；相对路径相对于插件目录\n"
+            'disk_dir = ""\n'
+            "# 磁盘缓存上限(MB)\n"
+            "max_disk_mb = 256\n\n"
+            "[assets]\n"
+            "# 离线渲染：浏览器不访问任何网络资源，字体只从本地目录提供，没有时使用系统字体；关闭后本地没有的字体从Google Fonts加载\n"
+            "offline = true\n"
+            "# 本地字体目录，存放fonts.css和字体文件；相对路径相对于插件目录\n"
+            'font_dir = "fonts"\n'
+            "# 渲染前并发下载新闻配图并内嵌到页面中\n"
+            "image_prefetch = true\n"
+            "# 单张配图下载时限(秒)，超时使用占位图\n"
+            "image_timeout = 3\n"
+            "# 单张配图大小上限(KB)\n"
+            "image_max_kb = 1024\n"
+            "# 配图缓存上限(MB)\n"
+            "image_cache_mb = 32\n\n"
+            "[rate_limit]\n"
+            "# 是否启用限流\n"
+            "enable = true\n"
+            "# 每个会话每分钟允许的请求数，0表示不限制\n"
+            "conversation_rate = 3\n"
+            "# 每个会话允许连续发起的请求数\n"
+            "conversation_burst = 2\n"
+            "# 所有会话合计每分钟允许的请求数，0表示不限制\n"
+            "global_rate = 30\n"
+            "# 所有会话合计允许连续发起的请求数\n"
+            "global_burst = 10\n"
+            "# 被限流时的回复，留空则不回复\n"
+            'reply = "请求过于频繁，请稍后再试。"\n\n'
+            "[broadcast]\n"
+            "# 群发时同时发送的会话数\n"
+            "concurrency = 5\n"
+            "# 群发时每分钟最多发送的消息数，0表示不限制\n"
+            "send_rate = 60\n"
+            "# 单个会话发送失败后的重试次数\n"
+            "max_retries = 2\n"
+            "# 重试间隔(秒)\n"
+            "retry_delay = 2\n\n"
+            "[schedule]\n"
+            "# 是否在固定时间预先拉取新闻并渲染图片，高峰时段直接使用缓存\n"
+            "enable = false\n"
+            "# 每天执行的时间(HH:MM)，建议设在高峰前几分钟，间隔不超过news_ttl\n"
+            'refresh_times = ["08:50", "11:50", "17:50"]\n'
+            "# 是否同时预渲染图片版报告\n"
+            "prerender = true\n\n"
+            "[metrics]\n"
+            "# 是否记录各处理阶段的耗时\n"
+            "enable = true\n"
+            "# 是否启动HTTP服务，以Prometheus文本格式导出指标(GET /metrics)\n"
+            "http_enable = false\n"
+            "# 监听地址，建议只监听本机\n"
+            'host = "127.0.0.1"\n'
+            "# 监听端口\n"
+            "port = 9464\n"
         )
         try:
             with open(example_config_path, "w", encoding="utf-8") as f_example:
@@ -108,20 +573,33 @@ class AIReport(PluginBase):
             logger.error(f"[{self.__class__.__name__}] 创建示例配置文件失败: {e}")
 
     async def async_init(self):
-        """完全不做初始化，确保启动速度"""
+        """不做耗时初始化，确保启动速度；定时任务在后台运行"""
         logger.debug(f"[{self.__class__.__name__}] async_init - 使用真正的懒加载模式，跳过初始化")
-        return
+        self._sync_scheduler()
+        if self.enable and self.browser_warmup == "startup":
+            self._schedule_warmup()
+        await self._apply_metrics_server()
 
     async def on_disable(self):
         """插件被禁用时清理资源"""
         logger.info(f"[{self.__class__.__name__}] on_disable called.")
+        await self.scheduler.stop()
+        await self.metrics_server.stop()
         await self._cleanup_playwright()
+        await self.news_client.close()
+        if self._store_executor is not None:
+            self._store_executor.shutdown(wait=False)
+            self._store_executor = None
+        self.news_store.close()
 
     def reload_config(self):
         """重新加载配置文件"""
         logger.info(f"[{self.__class__.__name__}] 正在重新加载配置...")
         old_enable_state = self.enable
         self._load_config()
+        self.news_template.invalidate()
+        self._sync_scheduler()
+        self._sync_metrics_server()
         if old_enable_state != self.enable:
             if self.enable:
                 logger.info(f"[{self.__class__.__name__}] 插件已启用。")
@@ -129,156 +607,379 @@ class AIReport(PluginBase):
                 logger.info(f"[{self.__class__.__name__}] 插件已禁用。")
         return {"success": True, "message": "配置已重新加载", "enable": self.enable}
 
+    def _select_render_worker(self):
+        """渲染模式变化时换用对应的渲染器，旧的渲染器在后台关闭"""
+        worker_class = RENDER_MODES[self.render_mode]
+        if type(self.render_worker) is worker_class:
+            return
+        old_worker, self.render_worker = self.render_worker, worker_class(font_dir=self.font_dir)
+        self.render_worker.on_timing = self.metrics.observe
+        logger.info(f"[{self.__class__.__name__}] 渲染模式切换为{self.render_mode}")
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 插件初始化时还没有事件循环，旧渲染器也尚未启动
+            return
+        task = asyncio.create_task(old_worker.stop(drain_timeout=self.drain_timeout))
+        self._retired_workers.add(task)
+        task.add_done_callback(self._retired_workers.discard)
+
+    def _register_metrics(self):
+        """把各组件已有的统计注册为指标，导出时直接读取"""
+        self.render_worker.on_timing = self.metrics.observe
+        self.pil_renderer.on_timing = self.metrics.observe
+
+        def cache_results():
+            news, images, assets = self.news_cache.stats(), self.image_cache.stats(), self.image_inliner.stats()
+            return {
+                ("news", "hit"): news["hits"], ("news", "stale"): news["stale_hits"], ("news", "miss"): news["misses"],
+                ("image", "hit"): images["hits"], ("image", "disk_hit"): images["disk_hits"], ("image", "miss"): images["misses"],
+                ("asset", "hit"): assets["hits"], ("asset", "miss"): assets["misses"],
+            }
+
+        self.metrics.counter("cache_lookups_total", "缓存查询次数", ["cache", "result"], func=cache_results)
+        self.metrics.counter("api_requests_total", "天行API请求次数(含重试)", func=lambda: self.news_client.requests)
+        self.metrics.counter("api_errors_total", "天行API请求失败次数", func=lambda: self.news_client.errors)
+        self.metrics.counter("api_breaker_trips_total", "API配额耗尽熔断次数", func=lambda: self.news_client.breaker_trips)
+        def source_values(field):
+            return lambda: {(name,): stats[field] for name, stats in self.aggregator.stats().items()}
+
+        self.metrics.counter("source_requests_total", "各新闻来源的请求次数", ["source"], func=source_values("requests"))
+        self.metrics.counter("source_errors_total", "各新闻来源的失败次数", ["source"], func=source_values("errors"))
+        self.metrics.counter("source_timeouts_total", "各新闻来源超过总时限被跳过的次数", ["source"], func=source_values("timeouts"))
+        self.metrics.gauge("source_last_seconds", "各新闻来源最近一次请求的耗时(秒)", ["source"], func=source_values("last_seconds"))
+        self.metrics.counter("news_store_inserted_total", "新闻库新增的资讯条数", func=lambda: self.news_store.inserted)
+        self.metrics.counter("rate_limited_total", "被限流的请求数", func=lambda: self.rate_limiter.rejected)
+        self.metrics.gauge("renders_in_flight", "排队中和渲染中的浏览器任务数", func=lambda: self.render_worker.pending)
+        self.metrics.gauge("requests_in_flight", "处理中的命令请求数", func=lambda: len(self._pending_requests))
+        self.metrics.gauge("image_cache_bytes", "图片缓存占用的内存字节数", func=lambda: self.image_cache.stats()["bytes"])
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回各阶段耗时的次数、平均值、p50/p95/p99和各项计数，供其他插件或管理命令查看"""
+        snapshot = self.metrics.snapshot()
+        if isinstance(self.render_worker, RenderService):
+            snapshot["render_service"] = self.render_worker.stats()
+        snapshot["sources"] = self.aggregator.stats()
+        return snapshot
+
+    def _sync_metrics_server(self):
+        """根据配置启动、重启或停止指标HTTP服务"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._spawn(self._apply_metrics_server())
+
+    async def _apply_metrics_server(self):
+        server = self.metrics_server
+        wanted = self.enable and self.metrics_http_enable
+        if server.running and (not wanted or (server.host, server.port) != (self.metrics_host, self.metrics_port)):
+            await server.stop()
+        if wanted and not server.running:
+            server.host, server.port = self.metrics_host, self.metrics_port
+            await server.start()
+
+    def _sync_scheduler(self):
+        """根据配置启动或停止定时任务"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self.enable and self.schedule_enable:
+            self.scheduler.start()
+        elif self.scheduler.running:
+            self._spawn(self.scheduler.stop())
+
+    def _spawn(self, coro):
+        """创建后台任务并保留引用，完成后自动移除"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def _scheduled_refresh(self):
+        """定时刷新新闻缓存，并预渲染图片版报告"""
+        if not self.enable or not self.api_key:
+            return
+        start_time = time.time()
+        api_key = self.api_key
+        fetch_num = max(self.text_news_count, self.image_news_count)
+        newslist = await self.news_cache.refresh(self.api_endpoint, fetch_num, lambda n: self._request_news(api_key, n))
+        if not newslist:
+            logger.warning(f"[{self.__class__.__name__}] 定时刷新新闻失败")
+            return
+        if self.schedule_prerender:
+            newslist, _ = await self._store_page(newslist[:self.image_news_count], self.image_news_count)
+            await self._prerender_image(newslist)
+        logger.info(f"[{self.__class__.__name__}] 定时刷新完成，用时: {time.time() - start_time:.2f}秒")
+
+    def _compile_commands(self):
+        """预编译命令表，消息处理时只需一次长度判断和一次字典查找"""
+        commands = {}
+        for command in self.text_commands:
+            commands[normalize_command(command)] = TEXT_COMMAND
+        for command in self.image_commands:
+            commands[normalize_command(command)] = IMAGE_COMMAND
+        commands.pop("", None)
+        prefixes = {normalize_command(prefix) for prefix in self.prefixes}
+        prefixes.discard("")
+        self._commands = commands
+        # 先匹配较长的前缀，如"老金，"优先于"老金"
+        self._prefixes = tuple(sorted(prefixes, key=len, reverse=True))
+        max_command = max((len(command) for command in commands), default=0)
+        max_prefix = max((len(prefix) for prefix in prefixes), default=0)
+        # 超过该长度的消息不可能是命令，留出空白和分隔符的余量
+        self._max_command_length = max_command + max_prefix + 16 if commands else 0
+
+    def _match_command(self, content: str):
+        """返回消息对应的命令，不是命令时返回None"""
+        if len(content) > self._max_command_length:
+            return None
+        text = normalize_command(content)
+        command = self._commands.get(text)
+        if command is not None:
+            return command
+        for prefix in self._prefixes:
+            if text.startswith(prefix):
+                return self._commands.get(text[len(prefix):].lstrip(PREFIX_SEPARATORS))
+        return None
+
+    def _parse_command(self, content: str):
+        """返回(命令, 参数)，不是命令时返回None
+
+        参数只在开启新闻库时识别："2"等页码表示翻页，"新"表示上次查看之后的新增资讯，第一页的参数为空
+        """
+        command = self._match_command(content)
+        if command is not None:
+            return command, ""
+        if not self.store_enable or len(content) > self._max_command_length:
+            return None
+        parts = normalize_command(content).rsplit(None, 1)
+        if len(parts) != 2:
+            return None
+        command = self._match_command(parts[0])
+        if command is None:
+            return None
+        arg = parts[1]
+        if arg.isdigit() and int(arg) > 0:
+            return command, "" if int(arg) == 1 else str(int(arg))
+        if arg in NEW_SINCE_ARGS:
+            return command, "new"
+        return None
+
     @on_text_message(priority=20)
     async def handle_text(self, bot: WechatAPIClient, message: dict):
         """处理文本消息，响应AI简讯和AI快讯命令"""
-        # 提取消息内容
-        message_content = ""
-        if isinstance(message, dict):
-            if 'Content' in message:
-                message_content = message['Content']
-            elif 'content' in message:
-                message_content = message['content']
-            elif 'text' in message:
-                message_content = message['text']
-        
-        message_content = message_content.strip() if isinstance(message_content, str) else ""
-        
-        # 提取会话ID
-        conversation_id = None
-        if isinstance(message, dict):
-            if 'FromWxid' in message:
-                conversation_id = message['FromWxid']
-            elif 'fromWxid' in message:
-                conversation_id = message['fromWxid']
-            elif 'conversation_id' in message:
-                conversation_id = message['conversation_id']
-        
-        if not message_content or not conversation_id:
+        if not self.enable or not isinstance(message, dict):
             return True
-        
-        if not self.enable:
+
+        # 提取消息内容，绝大多数消息在这里就被排除
+        message_content = message.get('Content') or message.get('content') or message.get('text')
+        if not isinstance(message_content, str) or len(message_content) > self._max_command_length:
             return True
+        match_start = time.perf_counter()
+        parsed = self._parse_command(message_content)
+        if parsed is None:
+            return True
+        # 只记录命令消息的匹配耗时，普通聊天消息不进入统计
+        self.metrics.observe("command_match", time.perf_counter() - match_start)
+        command, arg = parsed
 
-        content = message_content.strip()
-        
-        # 检查命令
-        if content in ["AI简讯", "ai简讯"]:
-            await bot.send_text_message(conversation_id, "正在获取AI简讯，请稍候...")
-            await self._process_request("AI简讯", bot, conversation_id)
+        # 提取会话ID
+        conversation_id = message.get('FromWxid') or message.get('fromWxid') or message.get('conversation_id')
+        if not conversation_id:
+            return True
+
+        # 同一会话已有相同请求在处理中时直接合并，结果会发送到同一会话
+        key = (conversation_id, command, arg)
+        if key in self._pending_requests:
+            logger.debug(f"[{self.__class__.__name__}] 合并重复请求: {conversation_id} {command}")
+            self.metrics.inc("merged_request")
             return False
-        elif content in ["AI快讯", "ai快讯", "AI资讯", "ai资讯"]:
-            await bot.send_text_message(conversation_id, "正在获取AI快讯，请稍候...")
-            await self._process_request("AI快讯", bot, conversation_id)
+
+        if self.rate_limit_enable and not self.rate_limiter.allow(conversation_id):
+            # 每个会话在令牌补充前只提示一次，避免刷屏时机器人跟着刷屏
+            if not self.rate_limiter.should_notify(conversation_id):
+                logger.debug(f"[{self.__class__.__name__}] 请求被限流，不再提示: {conversation_id} {command}")
+                return False
+            logger.warning(f"[{self.__class__.__name__}] 请求被限流: {conversation_id} {command}")
+            if self.rate_limit_reply:
+                await bot.send_text_message(conversation_id, self.rate_limit_reply)
             return False
-            
-        return True
 
-    async def _process_request(self, command: str, bot: WechatAPIClient, conversation_id: str):
+        if self.browser_warmup == "first_command":
+            # 获取新闻的同时在后台启动浏览器
+            self._schedule_warmup()
+        send_wait = not (command == TEXT_COMMAND and self.text_skip_wait and self._news_warm(self.text_news_count))
+        # 在后台处理，不阻塞消息处理；登记在任何await之前，同时到达的相同请求才能被合并
+        task = asyncio.create_task(self._process_request(command, bot, conversation_id, arg, send_wait))
+        self._pending_requests[key] = task
+        self._report_tasks.add(task)
+        task.add_done_callback(lambda done: self._on_request_done(key, done))
+        return False
+
+    def _on_request_done(self, key, task: asyncio.Task):
+        self._report_tasks.discard(task)
+        if self._pending_requests.get(key) is task:
+            del self._pending_requests[key]
+
+    async def _process_request(self, command: str, bot: WechatAPIClient, conversation_id: str, arg: str = "",
+                               send_wait: bool = True):
+        if send_wait:
+            try:
+                await bot.send_text_message(conversation_id, f"正在获取{command}，请稍候...")
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] 发送等待提示失败: {e}")
+        stage = "report_text" if command == TEXT_COMMAND else "report_image"
+        self.metrics.inc(stage)
+        with self.metrics.time(stage):
+            await self._process_command(command, bot, conversation_id, arg)
+
+    async def _process_command(self, command: str, bot: WechatAPIClient, conversation_id: str, arg: str = ""):
         try:
             if not self.api_key:
                 await bot.send_text_message(conversation_id, "API Key未配置，插件无法工作。")
                 return
 
-            num = self.text_news_count if command == "AI简讯" else self.image_news_count
-            news_data = await self._fetch_news(self.api_key, num)
+            num = self.text_news_count if command == TEXT_COMMAND else self.image_news_count
+            seen_id = None
+            with self.metrics.time("news_fetch"):
+                # 翻页和查看新增只读取新闻库，不调用API；新闻库由第一页请求和定时刷新更新
+                if arg == "new":
+                    news_data, seen_id = await self._store_call(self.news_store.since, conversation_id, num)
+                elif arg:
+                    news_data, _ = await self._store_call(self.news_store.latest, num, (int(arg) - 1) * num)
+                else:
+                    news_data, seen_id = await self._store_page(await self._fetch_news(self.api_key, num), num)
             if not news_data:
-                await bot.send_text_message(conversation_id, "获取资讯失败，请稍后重试。")
+                if arg == "new":
+                    reply = "上次查看之后暂无新资讯。"
+                elif arg:
+                    reply = f"第{arg}页没有更多资讯了。"
+                else:
+                    reply = "获取资讯失败，请稍后重试。"
+                await bot.send_text_message(conversation_id, reply)
                 return
 
-            if command == "AI简讯":
+            if command == TEXT_COMMAND:
                 await self._handle_text_report(news_data, bot, conversation_id)
             else:
-                # 使用更稳健的线程处理方式
-                start_time = time.time()
                 logger.debug(f"[{self.__class__.__name__}] 开始处理图片报告")
-                
-                # 创建和启动线程
-                thread = threading.Thread(
-                    target=self._run_playwright_in_thread,
-                    args=(news_data, bot, conversation_id)
-                )
-                thread.daemon = True
-                thread.start()
-                
-                # 不阻塞等待线程完成
-                logger.debug(f"[{self.__class__.__name__}] 已启动处理图片报告的后台线程")
-                
+                await self._handle_image_report(news_data, bot, conversation_id)
+            if seen_id is not None:
+                # 只标记读取时已在库中的资讯，翻看历史不影响"新增"的起点
+                try:
+                    await self._store_call(self.news_store.mark_seen, conversation_id, seen_id)
+                except Exception as e:
+                    logger.error(f"[{self.__class__.__name__}] 记录会话查看位置失败: {e}")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"[{self.__class__.__name__}] 处理请求失败: {e}", exc_info=True)
             await bot.send_text_message(conversation_id, "处理请求失败，请稍后重试。")
 
-    def _run_playwright_in_thread(self, news_data, bot, conversation_id):
-        """在单独的线程中运行Playwright操作"""
-        # 创建新的事件循环
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            # 在新事件循环中运行异步任务
-            start_time = time.time()
-            loop.run_until_complete(self._handle_image_report(news_data, bot, conversation_id))
-            duration = time.time() - start_time
-            logger.info(f"[{self.__class__.__name__}] 图片报告处理完成，用时: {duration:.2f}秒")
-        except Exception as e:
-            logger.error(f"[{self.__class__.__name__}] Playwright线程异常: {e}", exc_info=True)
-            # 在异常情况下使用文本模式
-            try:
-                loop.run_until_complete(self._send_text_alternative(news_data, bot, conversation_id))
-            except Exception as text_err:
-                logger.error(f"[{self.__class__.__name__}] 发送文本替代内容失败: {text_err}", exc_info=True)
-        finally:
-            # 清理事件循环
+    async def _fetch_news(self, api_key: str, num: int) -> List[Dict[str, Any]]:
+        """获取新闻数据，优先使用缓存；一次拉取足够两种报告使用的条数"""
+        fetch_num = max(num, self.text_news_count, self.image_news_count)
+        return await self.news_cache.get(
+            self.api_endpoint, num, lambda n: self._request_news(api_key, n), fetch_num=fetch_num
+        )
+
+    def _configure_sources(self):
+        """按配置重建来源列表，主接口排在最前，去重时优先保留"""
+        sources = [TianApiSource(source_name(self.api_endpoint, "tianapi:"), self.news_client, self.api_endpoint)]
+        for endpoint in self.extra_endpoints:
+            sources.append(TianApiSource(source_name(endpoint, "tianapi:"), self.news_client, endpoint))
+        plugin_dir = os.path.dirname(__file__)
+        for location in self.feeds:
+            if not location.startswith(("http://", "https://")) and not os.path.isabs(location):
+                location = os.path.join(plugin_dir, location)
+            sources.append(FeedSource(source_name(location, "feed:"), self.news_client, location,
+                                      timeout=self.source_deadline or 10))
+        names = set()
+        for index, source in enumerate(sources):
+            if source.name in names:
+                source.name = f"{source.name}#{index}"
+            names.add(source.name)
+        self.aggregator.configure(sources, self.source_deadline)
+
+    async def _request_news(self, api_key: str, num: int) -> List[Dict[str, Any]]:
+        """并发请求所有新闻来源并合并，结果合并到新闻库"""
+        with self.metrics.time("api_fetch"):
+            newslist = await self.aggregator.fetch(api_key, num)
+        if newslist and self.store_enable:
             try:
-                # 取消所有未完成的任务
-                pending = asyncio.all_tasks(loop)
-                for task in pending:
-                    task.cancel()
-                
-                # 运行取消任务的回调
-                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                
-                # 关闭事件循环
-                loop.close()
-                logger.debug(f"[{self.__class__.__name__}] 成功清理事件循环")
-            except Exception as cleanup_err:
-                logger.error(f"[{self.__class__.__name__}] 清理事件循环失败: {cleanup_err}")
+                added = await self._store_call(self.news_store.merge, newslist)
+                logger.debug(f"[{self.__class__.__name__}] 新闻库新增{added}条资讯")
+            except Exception as e:
+                logger.error(f"[{self.__class__.__name__}] 写入新闻库失败: {e}")
+        return newslist
 
-    async def _fetch_news(self, api_key: str, num: int) -> List[Dict[str, Any]]:
+    def _news_warm(self, num: int) -> bool:
+        """新闻缓存中已有未过期的数据，处理请求时不需要调用API"""
+        return self.news_cache.ttl > 0 and self.news_cache.peek(self.api_endpoint, num) is not None
+
+    async def _store_call(self, func, *args):
+        """在新闻库线程中执行操作，避免磁盘IO阻塞事件循环"""
+        if self._store_executor is None:
+            self._store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AIReport-store")
+        with self.metrics.time("news_store"):
+            return await asyncio.get_running_loop().run_in_executor(self._store_executor, func, *args)
+
+    async def _store_page(self, newslist: List[Dict[str, Any]], num: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """开启新闻库时第一页也从新闻库读取，与后续页的排序一致，条数不受单次API返回的限制
+
+        返回(新闻, 读取时新闻库的最大id)，未使用新闻库时id为None
+        """
+        if not self.store_enable:
+            return newslist, None
         try:
-            url = f"{self.api_endpoint}?key={api_key}&num={num}"
-            
-            loop = asyncio.get_running_loop()
-            response = await loop.run_in_executor(None, lambda: requests.get(url, timeout=30))
-            
-            if response.status_code != 200:
-                logger.error(f"[{self.__class__.__name__}] API返回非200状态码: {response.status_code}")
-                return []
-            
-            data = response.json()
-            
-            if data.get('code') == 200 and 'result' in data and 'newslist' in data['result']:
-                return data['result']['newslist']
-            
-            logger.error(f"[{self.__class__.__name__}] API返回格式不正确: {data}")
-            return []
+            items, newest = await self._store_call(self.news_store.latest, num, 0)
         except Exception as e:
-            logger.error(f"[{self.__class__.__name__}] 获取新闻数据失败: {e}")
-            return []
+            logger.error(f"[{self.__class__.__name__}] 读取新闻库失败: {e}")
+            return newslist, None
+        return (items, newest) if items else (newslist, None)
 
     async def _handle_text_report(self, newslist: List[Dict[str, Any]], bot: WechatAPIClient, conversation_id: str):
-        """处理文本版资讯并发送"""
+        """处理文本版资讯并按段依次发送"""
+        for chunk in self._format_text_chunks(newslist):
+            with self.metrics.time("send"):
+                await bot.send_text_message(conversation_id, chunk)
+
+    def _text_report_lines(self, newslist: List[Dict[str, Any]]) -> List[str]:
+        """生成文本版资讯内容：标题行和每条资讯各一项"""
         content_parts = ["📢 最新AI资讯如下："]
         for i, news in enumerate(newslist, 1):
             title = news.get('title', '未知标题').replace('\n', '')
             link = news.get('url', '未知链接').replace('\n', '')
             content_parts.append(f"No.{i}《{title}》\n🔗{link}")
-        
-        content = "\n".join(content_parts)
-        await bot.send_text_message(conversation_id, content)
+        return content_parts
+
+    def _format_text_chunks(self, newslist: List[Dict[str, Any]]) -> List[str]:
+        """把文本版资讯拆分为多条消息，每条不超过text_max_chars字
+
+        只在资讯之间拆分：标题行总是和第一条资讯一起发送，单条资讯超长时单独成一条消息，不截断链接。
+        """
+        lines = self._text_report_lines(newslist)
+        max_items = self.text_stream_items if self.text_stream else len(lines)
+        chunks = []
+        current, length, items = [lines[0]], len(lines[0]), 0
+        for line in lines[1:]:
+            if items and (items >= max_items or length + 1 + len(line) > self.text_max_chars):
+                chunks.append("\n".join(current))
+                current, length, items = [], -1, 0
+            current.append(line)
+            length += 1 + len(line)
+            items += 1
+        chunks.append("\n".join(current))
+        return chunks
 
     async def _send_text_alternative(self, newslist: List[Dict[str, Any]], bot: WechatAPIClient, conversation_id: str):
         """当图片渲染失败时发送文本替代内容"""
+        await bot.send_text_message(conversation_id, self._format_text_alternative(newslist))
+
+    def _format_text_alternative(self, newslist: List[Dict[str, Any]]) -> str:
+        """生成图片渲染失败时的文本替代内容"""
         content_parts = ["📢 最新AI资讯 (图片渲染不可用，以文本形式显示)："]
         for i, news in enumerate(newslist, 1):
             title = news.get('title', '未知标题').replace('\n', '')
@@ -287,223 +988,278 @@ class AIReport(PluginBase):
                 desc = desc[:97] + "..."
             content_parts.append(f"No.{i}《{title}》\n📝{desc}")
         
-        content = "\n".join(content_parts)
-        await bot.send_text_message(conversation_id, content)
+        return "\n".join(content_parts)
+
+    async def broadcast(self, bot: WechatAPIClient, conversation_ids: List[str], command: str = IMAGE_COMMAND) -> Dict[str, Any]:
+        """向多个会话群发资讯：只获取和渲染一次，再并发发送同一份内容
+
+        返回 {"success": [会话ID], "failed": {会话ID: 错误信息}, "duration": 秒}
+        """
+        start_time = time.time()
+        conversation_ids = list(dict.fromkeys(conversation_ids))
+        summary = {"success": [], "failed": {}, "duration": 0.0}
+        if not conversation_ids:
+            return summary
+        if not self.api_key:
+            summary["failed"] = {conversation_id: "API Key未配置" for conversation_id in conversation_ids}
+            return summary
+
+        command = TEXT_COMMAND if command == TEXT_COMMAND else IMAGE_COMMAND
+        num = self.text_news_count if command == TEXT_COMMAND else self.image_news_count
+        newslist, _ = await self._store_page(await self._fetch_news(self.api_key, num), num)
+        if not newslist:
+            summary["failed"] = {conversation_id: "获取资讯失败" for conversation_id in conversation_ids}
+            return summary
+
+        image_bytes = b""
+        texts = []
+        if command == TEXT_COMMAND:
+            texts = self._format_text_chunks(newslist)
+        else:
+            try:
+                image_bytes = await self._prerender_image(newslist)
+            except Exception as e:
+                logger.error(f"[{self.__class__.__name__}] 群发渲染图片失败: {e}", exc_info=True)
+            if not image_bytes:
+                texts = [self._format_text_alternative(newslist)]
+
+        semaphore = asyncio.Semaphore(self.broadcast_concurrency)
+        send_bucket = TokenBucket(self.broadcast_send_rate / 60, self.broadcast_concurrency) if self.broadcast_send_rate > 0 else None
+
+        async def acquire_send():
+            if send_bucket is not None:
+                while not send_bucket.try_acquire():
+                    await asyncio.sleep(send_bucket.retry_after())
+
+        async def deliver(conversation_id: str):
+            async with semaphore:
+                # 已发送的分段数，重试时从失败的分段继续
+                sent = 0
+                for attempt in range(self.broadcast_max_retries + 1):
+                    try:
+                        if image_bytes:
+                            await acquire_send()
+                            await self._send_image_bytes(image_bytes, bot, conversation_id)
+                        else:
+                            while sent < len(texts):
+                                await acquire_send()
+                                await bot.send_text_message(conversation_id, texts[sent])
+                                sent += 1
+                        summary["success"].append(conversation_id)
+                        return
+                    except Exception as e:
+                        logger.warning(f"[{self.__class__.__name__}] 发送到 {conversation_id} 失败 (第{attempt + 1}次): {e}")
+                        if attempt >= self.broadcast_max_retries:
+                            summary["failed"][conversation_id] = str(e) or e.__class__.__name__
+                            return
+                        await asyncio.sleep(self.broadcast_retry_delay * (attempt + 1))
+
+        await asyncio.gather(*(deliver(conversation_id) for conversation_id in conversation_ids))
+        summary["duration"] = time.time() - start_time
+        logger.info(f"[{self.__class__.__name__}] 群发{command}完成: 成功{len(summary['success'])}个，"
+                    f"失败{len(summary['failed'])}个，用时: {summary['duration']:.2f}秒")
+        return summary
 
     async def _handle_image_report(self, newslist: List[Dict[str, Any]], bot: WechatAPIClient, conversation_id: str):
         """处理图片版资讯并发送"""
+        start_time = time.time()
         try:
-            html_content = self._generate_html(newslist)
-            if not html_content:
-                logger.error(f"[{self.__class__.__name__}] 生成HTML内容失败")
-                await bot.send_text_message(conversation_id, "生成HTML内容失败，无法创建图片报告。")
+            try:
+                image_bytes = await self._prerender_image(newslist)
+            except RenderQueueFull:
+                logger.warning(f"[{self.__class__.__name__}] 渲染队列已满，拒绝本次图片请求")
+                self.metrics.inc("render_queue_full")
+                await bot.send_text_message(conversation_id, "当前图片请求较多，请稍后再试。")
+                return
+            except Exception as e:
+                logger.error(f"[{self.__class__.__name__}] 渲染图片失败: {e}", exc_info=True)
+                image_bytes = b""
+
+            if not image_bytes:
+                self.metrics.inc("fallback_text")
+                await bot.send_text_message(conversation_id, "生成图片失败，请稍后重试。")
                 await self._send_text_alternative(newslist, bot, conversation_id)
                 return
-                
-            # 渲染并发送图片
-            await self._render_and_send_image(html_content, bot, conversation_id)
+
+            await self._send_image_bytes(image_bytes, bot, conversation_id)
+            logger.info(f"[{self.__class__.__name__}] 图片报告处理完成，用时: {time.time() - start_time:.2f}秒")
         except Exception as e:
             logger.error(f"[{self.__class__.__name__}] 处理图片报告失败: {e}", exc_info=True)
             await self._send_text_alternative(newslist, bot, conversation_id)
 
-    async def _init_playwright(self):
-        """延迟初始化Playwright，只在需要时才创建实例"""
-        # 使用锁确保只有一个线程执行初始化
-        with self.playwright_lock:
-            # 如果已经初始化完成，直接返回
-            if self.browser:
-                return True
-                
-            # 如果已经在初始化中，等待初始化完成
-            if self.is_initializing:
-                logger.debug(f"[{self.__class__.__name__}] Playwright正在初始化中，等待...")
-                return False  # 让调用者知道目前无法使用Playwright
-            
-            # 设置初始化标志
-            self.is_initializing = True
-        
+    async def _prerender_image(self, newslist: List[Dict[str, Any]]) -> bytes:
+        """渲染图片并写入缓存但不发送，已有缓存时直接返回；相同内容同时只渲染一次"""
+        if not self.image_cache_enable:
+            image_bytes, _, _ = await self._render_image(newslist)
+            return image_bytes
+
+        cache_key = self._image_cache_key(newslist)
+        future = self._image_renders.get(cache_key)
+        if future is not None:
+            logger.debug(f"[{self.__class__.__name__}] 合并相同内容的图片渲染")
+            self.metrics.inc("merged_render")
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._image_renders[cache_key] = future
         try:
-            # 这里才真正导入playwright，避免启动时加载
-            try:
-                from playwright.async_api import async_playwright
-                logger.info(f"[{self.__class__.__name__}] 成功导入playwright模块")
-            except ImportError as imp_err:
-                logger.error(f"[{self.__class__.__name__}] 导入playwright模块失败: {imp_err}")
-                self.is_initializing = False
-                return False
-                
-            logger.info(f"[{self.__class__.__name__}] 正在初始化Playwright...")
-            start_time = time.time()
-            
-            try:
-                playwright_instance = await async_playwright().start()
-                logger.debug(f"[{self.__class__.__name__}] async_playwright().start() 完成，用时: {time.time() - start_time:.2f}秒")
-            except NotImplementedError as nie:
-                logger.error(f"[{self.__class__.__name__}] Playwright初始化失败 (NotImplementedError - 可能是Anaconda环境问题): {nie}")
-                self.is_initializing = False
-                return False
-            except Exception as start_err:
-                logger.error(f"[{self.__class__.__name__}] Playwright启动失败: {start_err}", exc_info=True)
-                self.is_initializing = False
-                return False
-            
-            try:
-                logger.debug(f"[{self.__class__.__name__}] 正在启动Chromium浏览器...")
-                browser_start = time.time()
-                browser = await playwright_instance.chromium.launch(
-                    args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-gpu'],
-                    headless=True
-                )
-                logger.debug(f"[{self.__class__.__name__}] Chromium浏览器启动完成，用时: {time.time() - browser_start:.2f}秒")
-                
-                # 只有成功启动浏览器后才设置实例变量
-                self.playwright_instance = playwright_instance
-                self.browser = browser
-                
-                logger.success(f"[{self.__class__.__name__}] Playwright初始化成功，总用时: {time.time() - start_time:.2f}秒")
-                return True
-            except Exception as browser_err:
-                # 浏览器启动失败，关闭playwright实例
-                logger.error(f"[{self.__class__.__name__}] 启动Chromium浏览器失败: {browser_err}", exc_info=True)
-                try:
-                    if playwright_instance:
-                        await playwright_instance.stop()
-                except Exception as stop_err:
-                    logger.error(f"[{self.__class__.__name__}] 停止Playwright实例失败: {stop_err}")
-                return False
+            with self.metrics.time("image_cache"):
+                image_bytes = await self.image_cache.get(cache_key)
+            if image_bytes:
+                logger.debug(f"[{self.__class__.__name__}] 命中图片缓存")
+            else:
+                image_bytes, engine, complete = await self._render_image(newslist)
+                # 回退引擎生成的图片和使用了占位配图的图片不写入缓存，恢复后重新渲染
+                if image_bytes and engine == self.render_engine and complete:
+                    self.image_cache.put(cache_key, image_bytes)
+            future.set_result(image_bytes)
+            return image_bytes
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
         except Exception as e:
-            logger.error(f"[{self.__class__.__name__}] Playwright初始化过程中发生未捕获的异常: {e}", exc_info=True)
-            return False
+            future.set_exception(e)
+            # 避免无人等待时出现"exception was never retrieved"
+            future.exception()
+            raise
         finally:
-            # 重置初始化标志
-            self.is_initializing = False
+            self._image_renders.pop(cache_key, None)
 
-    async def _cleanup_playwright(self):
-        """清理Playwright资源"""
+    async def _render_image(self, newslist: List[Dict[str, Any]]) -> Tuple[bytes, str, bool]:
+        """按配置的引擎渲染，返回(图片, 实际使用的引擎, 配图是否完整)；浏览器渲染失败时按fallback回退"""
+        if self.render_engine == "pillow":
+            image_bytes, complete = await self._render_with_pillow(newslist)
+            return image_bytes, "pillow", complete
+        image_bytes, complete = b"", True
         try:
-            with self.playwright_lock:
-                if self.browser:
-                    logger.info(f"[{self.__class__.__name__}] 正在关闭Playwright浏览器...")
-                    try:
-                        await self.browser.close()
-                        logger.debug(f"[{self.__class__.__name__}] Playwright浏览器已关闭")
-                    except Exception as e:
-                        logger.error(f"[{self.__class__.__name__}] 关闭浏览器失败: {e}")
-                    finally:
-                        self.browser = None
-                    
-                if self.playwright_instance:
-                    logger.info(f"[{self.__class__.__name__}] 正在停止Playwright实例...")
-                    try:
-                        await self.playwright_instance.stop()
-                        logger.debug(f"[{self.__class__.__name__}] Playwright实例已停止")
-                    except Exception as e:
-                        logger.error(f"[{self.__class__.__name__}] 停止Playwright实例失败: {e}")
-                    finally:
-                        self.playwright_instance = None
-                        
-                logger.success(f"[{self.__class__.__name__}] Playwright资源已清理")
+            image_bytes, complete = await self._render_with_browser(newslist)
+        except RenderQueueFull:
+            if self.render_fallback != "pillow":
+                raise
+            logger.warning(f"[{self.__class__.__name__}] 渲染队列已满，改用Pillow渲染")
         except Exception as e:
-            logger.error(f"[{self.__class__.__name__}] 清理Playwright资源失败: {e}", exc_info=True)
-        finally:
-            self.browser = None
-            self.playwright_instance = None
-            self.is_initializing = False
+            if self.render_fallback != "pillow":
+                raise
+            logger.error(f"[{self.__class__.__name__}] 浏览器渲染失败，改用Pillow渲染: {e}", exc_info=True)
+        if image_bytes or self.render_fallback != "pillow":
+            return image_bytes, "browser", complete
+        self.metrics.inc("fallback_pillow")
+        image_bytes, complete = await self._render_with_pillow(newslist)
+        return image_bytes, "pillow", complete
 
-    async def _render_and_send_image(self, html_content: str, bot: WechatAPIClient, conversation_id: str):
-        """渲染HTML并发送图片"""
+    async def _render_with_browser(self, newslist: List[Dict[str, Any]]) -> Tuple[bytes, bool]:
+        """在预加载模板的页面中填入新闻单元并截图，返回(图片, 配图是否完整)"""
+        with self.metrics.time("html_generation"):
+            shell = self._generate_shell()
+        if not shell:
+            return b"", True
+        complete = True
         # 懒加载初始化Playwright - 这是唯一需要Playwright的地方
-        initialized = await self._init_playwright()
-        if not initialized:
-            logger.error(f"[{self.__class__.__name__}] Playwright初始化失败，回退到文本模式")
-            await self._send_text_alternative([], bot, conversation_id)
+        if self.image_prefetch:
+            # 下载配图的同时启动浏览器
+            (newslist, complete), started = await asyncio.gather(self._inline_images(newslist), self._init_playwright(shell))
+        else:
+            started = await self._init_playwright(shell)
+        if not started:
+            logger.error(f"[{self.__class__.__name__}] Playwright初始化失败")
+            return b"", complete
+        with self.metrics.time("html_generation"):
+            news_html = self._generate_news_units(newslist)
+        with self.metrics.time("render_browser"):
+            image_bytes = await self.render_worker.render(shell, news_html)
+        if not image_bytes:
+            logger.error(f"[{self.__class__.__name__}] 截图为空")
+        return image_bytes, complete
+
+    async def _render_with_pillow(self, newslist: List[Dict[str, Any]]) -> Tuple[bytes, bool]:
+        """用Pillow直接绘制，配图需要先内嵌为data URI；返回(图片, 配图是否完整)"""
+        if not pillow_available():
+            logger.error(f"[{self.__class__.__name__}] 未安装Pillow，无法使用pillow渲染引擎")
+            return b"", True
+        newslist, complete = await self._inline_images(newslist)
+        loop = asyncio.get_running_loop()
+        with self.metrics.time("render_pillow"):
+            return await loop.run_in_executor(None, self.pil_renderer.render, newslist), complete
+
+    async def _inline_images(self, newslist: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], bool]:
+        with self.metrics.time("asset_inline"):
+            return await self.image_inliner.inline(newslist)
+
+    def _schedule_warmup(self):
+        """在后台启动浏览器并预热页面池，只执行一次，不阻塞调用方"""
+        if self.render_engine != "browser" or self._warmup_task is not None:
             return
-        
-        page = None
+        self._warmup_task = asyncio.create_task(self._warmup())
+
+    async def _warmup(self):
+        shell = self._generate_shell()
+        if shell and await self._init_playwright(shell):
+            logger.info(f"[{self.__class__.__name__}] 浏览器预热完成")
+
+    async def _init_playwright(self, shell: str = None):
+        """延迟初始化Playwright，只在需要时才启动渲染线程和浏览器"""
+        with self.metrics.time("browser_start"):
+            return await self.render_worker.start(shell)
+
+    async def _cleanup_playwright(self):
+        """清理Playwright资源：先等待处理中的请求和渲染完成，超时后再取消"""
         try:
-            page = await self.browser.new_page()
-            await page.set_viewport_size({"width": 700, "height": 1380})
-            
-            # 设置更长的超时时间
-            await page.set_content(html_content, timeout=60000)
-            await page.wait_for_load_state("networkidle", timeout=60000)  # 等待所有资源加载完成
-            
-            screenshot_bytes = await page.screenshot(full_page=True, type='png')
-            
-            if screenshot_bytes:
-                try:
-                    await bot.send_image(conversation_id, screenshot_bytes)
-                    logger.info(f"[{self.__class__.__name__}] 图片发送成功")
-                except AttributeError:
-                    await bot.send_image_message(conversation_id, screenshot_bytes)
-                    logger.info(f"[{self.__class__.__name__}] 图片发送成功(使用send_image_message)")
-            else:
-                logger.error(f"[{self.__class__.__name__}] 截图为空")
-                await bot.send_text_message(conversation_id, "生成图片失败，请稍后重试。")
-                await self._send_text_alternative([], bot, conversation_id)
+            deadline = time.monotonic() + self.drain_timeout
+            if self._warmup_task is not None:
+                self._warmup_task.cancel()
+                self._warmup_task = None
+            pending = [task for task in self._report_tasks if not task.done()]
+            if pending and self.drain_timeout > 0:
+                logger.info(f"[{self.__class__.__name__}] 等待{len(pending)}个处理中的请求完成")
+                await asyncio.wait(pending, timeout=self.drain_timeout)
+            for task in list(self._report_tasks):
+                task.cancel()
+            # 定时预渲染和群发的渲染任务不在_report_tasks中，由渲染器自行等待
+            await self.render_worker.stop(drain_timeout=max(0.0, deadline - time.monotonic()))
+            await asyncio.gather(*self._retired_workers, return_exceptions=True)
+            logger.success(f"[{self.__class__.__name__}] Playwright资源已清理")
         except Exception as e:
-            logger.error(f"[{self.__class__.__name__}] 渲染图片失败: {e}", exc_info=True)
-            await self._send_text_alternative([], bot, conversation_id)
-        finally:
-            if page:
-                try:
-                    await page.close()
-                except Exception as e:
-                    logger.error(f"[{self.__class__.__name__}] 关闭页面失败: {e}")
+            logger.error(f"[{self.__class__.__name__}] 清理Playwright资源失败: {e}", exc_info=True)
 
-    def _generate_html(self, newslist: List[Dict[str, Any]]) -> str:
-        """生成HTML内容"""
+    async def _send_image_bytes(self, image_bytes: bytes, bot: WechatAPIClient, conversation_id: str):
+        """发送图片"""
+        with self.metrics.time("send"):
+            try:
+                await bot.send_image(conversation_id, image_bytes)
+                logger.info(f"[{self.__class__.__name__}] 图片发送成功")
+            except AttributeError:
+                await bot.send_image_message(conversation_id, image_bytes)
+                logger.info(f"[{self.__class__.__name__}] 图片发送成功(使用send_image_message)")
+
+    def _image_cache_key(self, newslist: List[Dict[str, Any]]) -> str:
+        """图片缓存key：模板中用到的新闻字段 + 渲染引擎 + 模板/二维码文件版本 + 视口大小"""
+        output_format = self.pil_renderer.image_format if self.render_engine == "pillow" else self.render_worker.image_format
+        versions = [
+            self.render_engine, self.viewport_width, self.viewport_height, self.news_template.version,
+            output_format, self.image_quality, self.image_min_quality, self.image_max_kb,
+            self.image_scale, self.image_clip_selector,
+        ]
+        return make_image_key(newslist, ("title", "description", "ctime", "picUrl"), versions)
+
+    def _generate_shell(self) -> str:
+        """生成不含新闻内容的模板外壳，供页面池预加载"""
         try:
-            if not os.path.exists(self.template_path):
-                logger.error(f"[{self.__class__.__name__}] HTML模板文件未找到: {self.template_path}")
-                return ""
-
-            with open(self.template_path, 'r', encoding='utf-8') as f:
-                template = f.read()
-    
-            # 读取QR码图片并编码为Base64
-            qr_code_path = os.path.join(os.path.dirname(__file__), "QRcode.png")
-            if os.path.exists(qr_code_path):
-                try:
-                    with open(qr_code_path, 'rb') as image_file:
-                        encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-                    data_uri = f"data:image/png;base64,{encoded_string}"
-                    template = template.replace("QRcode.png", data_uri)
-                except:
-                    pass
-    
-            # 渲染新闻内容
-            news_units = ""
-            for news_item in newslist:
-                title = news_item.get('title', '未知标题')
-                description = news_item.get('description', '无描述')
-                if len(description) > 100:
-                    description = description[:100] + '...'
-                ctime = news_item.get('ctime', '未知时间')
-                picUrl = news_item.get('picUrl', '')
-    
-                news_units += f'''
-                <div class="news-unit">
-                    <img src="{picUrl}" alt="news image">
-                    <div class="text-block">
-                        <div class="title">{title}</div>
-                        <div class="description">{description}</div>
-                        <div class="ctime">{ctime}</div>
-                    </div>
-                </div>'''
-    
-            # 将动态生成的新闻单元替换到模板中
-            final_html = template.replace('<!-- NEWS_CONTENT -->', news_units)
-            return final_html
+            return self.news_template.shell()
         except Exception as e:
             logger.error(f"[{self.__class__.__name__}] 生成HTML内容失败: {e}", exc_info=True)
             return ""
 
+    def _generate_news_units(self, newslist: List[Dict[str, Any]]) -> str:
+        """渲染新闻单元HTML片段"""
+        return self.news_template.render_units(newslist)
+
     def get_help_text(self, **kwargs):
         help_text = """AI资讯获取助手
         指令：
         1. 发送"AI简讯"：获取文字版AI资讯，包含标题和原文链接
         2. 发送"AI快讯"或"AI资讯"：获取图片版AI资讯，包含标题、简介和发布时间
+        3. 命令后加页码如"AI简讯 2"：翻看更早的资讯
+        4. 命令后加"新"如"AI快讯 新"：只看上次查看之后的新资讯
         
         注意：
         - 文字版显示10条最新资讯
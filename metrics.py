@@ -0,0 +1,294 @@
+import asyncio
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+# 秒为单位的默认分桶，覆盖从命令匹配(微秒级)到浏览器启动(秒级)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 每组标签保留最近的样本数，用于计算分位数
+RESERVOIR_SIZE = 2048
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """最近邻法计算分位数，samples需已排序"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+    return samples[index]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 func: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # func返回当前值，或{标签值元组: 值}，用于直接读取各组件已有的统计
+        self.func = func
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Tuple[Any, ...]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        return tuple(str(label) for label in labels)
+
+    def collect(self) -> Dict[LabelValues, float]:
+        if self.func is None:
+            with self._lock:
+                return dict(self._values)
+        value = self.func()
+        return dict(value) if isinstance(value, dict) else {(): value}
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count", "max", "samples")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+
+class Histogram(_Metric):
+    """累积分桶直方图，同时保留最近的样本以计算p50/p95/p99"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+            series.max = max(series.max, value)
+            series.samples.append(value)
+
+    def summary(self) -> Dict[LabelValues, Dict[str, float]]:
+        with self._lock:
+            series_items = [(key, series.count, series.sum, series.max, sorted(series.samples))
+                            for key, series in self._series.items()]
+        result = {}
+        for key, count, total, maximum, samples in series_items:
+            result[key] = {
+                "count": count,
+                "avg": total / count if count else 0.0,
+                "p50": percentile(samples, 0.5),
+                "p95": percentile(samples, 0.95),
+                "p99": percentile(samples, 0.99),
+                "max": maximum,
+            }
+        return result
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            series_items = sorted((key, list(series.counts), series.sum, series.count)
+                                  for key, series in self._series.items())
+        for key, counts, total, count in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Metrics:
+    """插件的指标集合：各阶段耗时直方图、计数器和读取组件状态的仪表"""
+
+    def __init__(self, prefix: str = "aireport", enabled: bool = True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self.stages = self.histogram("stage_seconds", "各处理阶段耗时(秒)", ["stage"])
+        self.events = self.counter("events_total", "请求、回退和错误等事件次数", ["event"])
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = (), func=None) -> Counter:
+        return self._register(Counter(f"{self.prefix}_{name}", documentation, labelnames, func))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), func=None) -> Gauge:
+        return self._register(Gauge(f"{self.prefix}_{name}", documentation, labelnames, func))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(f"{self.prefix}_{name}", documentation, labelnames, buckets))
+
+    def observe(self, stage: str, seconds: float):
+        """记录一个阶段的耗时，可在任意线程中调用"""
+        if self.enabled:
+            self.stages.observe(seconds, stage)
+
+    def inc(self, event: str, amount: float = 1):
+        if self.enabled:
+            self.events.inc(event, amount=amount)
+
+    @contextmanager
+    def time(self, stage: str):
+        """with metrics.time("api_fetch"): ... 记录代码块耗时，异常时同样记录"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.observe(time.perf_counter() - start, stage)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """各阶段的次数、平均值和分位数，以及所有计数器和仪表的当前值"""
+        result: Dict[str, Any] = {"stages": {}, "counters": {}, "gauges": {}}
+        for key, summary in self.stages.summary().items():
+            result["stages"][key[0]] = summary
+        for metric in self._metrics.values():
+            if isinstance(metric, Histogram):
+                continue
+            section = result["counters"] if isinstance(metric, Counter) else result["gauges"]
+            name = metric.name[len(self.prefix) + 1:]
+            try:
+                values = metric.collect()
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] 读取指标{metric.name}失败: {e}")
+                continue
+            for labels, value in values.items():
+                section[".".join((name,) + labels)] = value
+        return result
+
+    def expose(self) -> str:
+        """Prometheus文本格式"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.expose())
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] 导出指标{metric.name}失败: {e}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """只提供GET /metrics的最小HTTP服务，供Prometheus抓取"""
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9464):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    async def start(self):
+        if self._server is not None:
+            return
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        except OSError as e:
+            logger.error(f"[{self.__class__.__name__}] 启动指标服务失败 {self.host}:{self.port}: {e}")
+            return
+        logger.info(f"[{self.__class__.__name__}] 指标服务已启动: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        server.close()
+        await server.wait_closed()
+        logger.info(f"[{self.__class__.__name__}] 指标服务已停止")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # 读完请求头，忽略内容
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) >= 2 else ""
+            if len(parts) >= 2 and parts[0] == "GET" and path in ("/", "/metrics"):
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.metrics.expose().encode("utf-8")
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.warning(f"[{self.__class__.__name__}] 处理指标请求失败: {e}")
+        finally:
+            writer.close()
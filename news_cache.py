@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+NewsLoader = Callable[[int], Awaitable[List[Dict[str, Any]]]]
+
+
+class _CacheEntry:
+    __slots__ = ("items", "num", "fetched_at")
+
+    def __init__(self, items: List[Dict[str, Any]], num: int, fetched_at: float):
+        self.items = items
+        self.num = num
+        self.fetched_at = fetched_at
+
+
+class NewsCache:
+    """新闻数据缓存：按(endpoint, num)缓存，支持TTL、过期后后台刷新以及并发请求合并"""
+
+    def __init__(self, ttl: float = 600, stale_ttl: float = 1800):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[Tuple[str, int], _CacheEntry] = {}
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._refresh_tasks: set = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def configure(self, ttl: float, stale_ttl: float):
+        """更新TTL配置，已缓存的数据保留"""
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def clear(self):
+        self._entries.clear()
+
+    def _lookup(self, endpoint: str, num: int) -> Optional[_CacheEntry]:
+        """查找能满足num条的最新缓存，较大的结果可以切片使用"""
+        best = None
+        for (entry_endpoint, entry_num), entry in self._entries.items():
+            if entry_endpoint != endpoint or entry_num < num:
+                continue
+            if best is None or entry.fetched_at > best.fetched_at:
+                best = entry
+        return best
+
+    def peek(self, endpoint: str, num: int) -> Optional[List[Dict[str, Any]]]:
+        """仅返回未过期的缓存数据，不触发任何请求"""
+        entry = self._lookup(endpoint, num)
+        if entry is None or time.monotonic() - entry.fetched_at >= self.ttl:
+            return None
+        return entry.items[:num]
+
+    async def get(self, endpoint: str, num: int, loader: NewsLoader, fetch_num: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取num条新闻，未命中时调用loader(fetch_num)拉取并缓存"""
+        fetch_num = max(num, fetch_num or num)
+        if self.ttl <= 0:
+            return (await loader(fetch_num))[:num]
+
+        entry = self._lookup(endpoint, num)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return entry.items[:num]
+            if age < self.ttl + self.stale_ttl:
+                # 先返回旧数据，后台刷新
+                self.stale_hits += 1
+                self._schedule_refresh(endpoint, entry.num, loader)
+                return entry.items[:num]
+
+        self.misses += 1
+        items = await self._load(endpoint, fetch_num, loader)
+        return items[:num]
+
+    async def refresh(self, endpoint: str, num: int, loader: NewsLoader) -> List[Dict[str, Any]]:
+        """强制刷新指定条数的缓存"""
+        return await self._load(endpoint, num, loader)
+
+    def _schedule_refresh(self, endpoint: str, num: int, loader: NewsLoader):
+        if (endpoint, num) in self._inflight:
+            return
+        task = asyncio.create_task(self._load(endpoint, num, loader))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _load(self, endpoint: str, num: int, loader: NewsLoader) -> List[Dict[str, Any]]:
+        """同一个key同时只发起一次请求，其余调用者等待同一个结果"""
+        key = (endpoint, num)
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            items = await loader(num)
+            if items:
+                self._entries[key] = _CacheEntry(items, num, time.monotonic())
+            else:
+                # 拉取失败时保留旧数据
+                stale = self._entries.get(key)
+                if stale is not None:
+                    logger.warning(f"[{self.__class__.__name__}] 刷新失败，继续使用旧缓存: {endpoint} num={num}")
+                    items = stale.items
+            future.set_result(items)
+            return items
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 避免无人等待时出现"exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "inflight": len(self._inflight),
+        }
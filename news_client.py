@@ -0,0 +1,109 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+# 天行API业务错误码：130调用频率超限，150可用次数不足
+DEFAULT_QUOTA_CODES = (130, 150)
+# 可重试的业务错误码：100内部服务器错误
+RETRYABLE_CODES = (100,)
+
+
+class NewsApiClient:
+    """天行API异步客户端：长连接复用、超时重试，配额耗尽后熔断"""
+
+    def __init__(self, connect_timeout: float = 5, read_timeout: float = 10, max_retries: int = 2,
+                 backoff_base: float = 0.5, quota_codes: Iterable[int] = DEFAULT_QUOTA_CODES,
+                 breaker_cooldown: float = 600):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.quota_codes = set(quota_codes)
+        self.breaker_cooldown = breaker_cooldown
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._open_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.breaker_trips = 0
+
+    def configure(self, connect_timeout: float, read_timeout: float, max_retries: int, backoff_base: float,
+                  quota_codes: Iterable[int], breaker_cooldown: float):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.quota_codes = set(quota_codes)
+        self.breaker_cooldown = breaker_cooldown
+
+    @property
+    def breaker_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def _timeout(self, total: Optional[float] = None) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=total, sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """在首次请求时创建会话，之后复用连接"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=20, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout())
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _backoff(self, attempt: int) -> float:
+        # 指数退避，加入随机抖动避免多个请求同时重试
+        return self.backoff_base * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def fetch_news(self, endpoint: str, api_key: str, num: int) -> List[Dict[str, Any]]:
+        """获取新闻列表，失败时返回空列表"""
+        if self.breaker_open:
+            logger.warning(f"[{self.__class__.__name__}] API配额已耗尽，熔断中，{self._open_until - time.monotonic():.0f}秒后恢复")
+            return []
+
+        params = {"key": api_key, "num": num}
+        for attempt in range(self.max_retries + 1):
+            retryable = False
+            self.requests += 1
+            try:
+                async with self._get_session().get(endpoint, params=params) as response:
+                    if response.status != 200:
+                        logger.error(f"[{self.__class__.__name__}] API返回非200状态码: {response.status}")
+                        retryable = response.status >= 500 or response.status == 429
+                    else:
+                        data = await response.json(content_type=None)
+                        code = data.get('code')
+                        if code == 200 and 'result' in data and 'newslist' in data['result']:
+                            return data['result']['newslist']
+                        if code in self.quota_codes:
+                            self._open_until = time.monotonic() + self.breaker_cooldown
+                            self.breaker_trips += 1
+                            logger.error(f"[{self.__class__.__name__}] API配额耗尽(code={code})，暂停调用{self.breaker_cooldown:.0f}秒: {data.get('msg')}")
+                            self.errors += 1
+                            return []
+                        logger.error(f"[{self.__class__.__name__}] API返回格式不正确: {data}")
+                        retryable = code in RETRYABLE_CODES
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"[{self.__class__.__name__}] 请求API失败 (第{attempt + 1}次): {e!r}")
+                retryable = True
+            except Exception as e:
+                logger.error(f"[{self.__class__.__name__}] 获取新闻数据失败: {e}")
+
+            self.errors += 1
+            if not retryable or attempt >= self.max_retries:
+                return []
+            await asyncio.sleep(self._backoff(attempt))
+        return []
+
+    async def get_bytes(self, url: str, timeout: float) -> Tuple[bytes, str]:
+        """下载文件，返回(内容, Content-Type)"""
+        async with self._get_session().get(url, timeout=self._timeout(total=timeout)) as response:
+            response.raise_for_status()
+            return await response.read(), response.headers.get("Content-Type", "")
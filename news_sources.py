@@ -0,0 +1,262 @@
+import asyncio
+import re
+import time
+import unicodedata
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from html import unescape
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from .news_client import NewsApiClient
+
+CTIME_FORMAT = "%Y-%m-%d %H:%M"
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+_TAG_RE = re.compile(r"<[^>]+>")
+# 标题去重时忽略空白和标点
+_TITLE_STRIP_RE = re.compile(r"[\W_]+")
+
+
+def normalize_url(url: str) -> str:
+    """去掉协议、www、片段和末尾斜杠，用于判断是否为同一篇文章"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/")
+    return f"{host}{path}?{parts.query}" if parts.query else f"{host}{path}"
+
+
+def source_name(location: str, prefix: str = "") -> str:
+    """来源的简短名称：URL取域名和首段路径，本地文件取文件名"""
+    parts = urlsplit(location)
+    if parts.scheme in ("http", "https"):
+        segment = parts.path.strip("/").split("/")[0]
+        name = f"{parts.netloc}/{segment}" if segment else parts.netloc
+    else:
+        name = location.replace("\\", "/").rsplit("/", 1)[-1]
+    return f"{prefix}{name}"
+
+
+def normalize_title(title: str) -> str:
+    return _TITLE_STRIP_RE.sub("", unicodedata.normalize("NFKC", title).casefold())
+
+
+def _format_time(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.strftime(CTIME_FORMAT)
+
+
+def parse_feed_time(text: Optional[str]) -> str:
+    """RSS的RFC 822时间或Atom的ISO 8601时间转换为本地时间"YYYY-MM-DD HH:MM"，无法解析时返回空字符串"""
+    if not text:
+        return ""
+    text = text.strip()
+    try:
+        return _format_time(parsedate_to_datetime(text))
+    except (TypeError, ValueError, IndexError):
+        pass
+    try:
+        return _format_time(datetime.fromisoformat(text.replace("Z", "+00:00")))
+    except ValueError:
+        return ""
+
+
+def _plain_text(text: Optional[str]) -> str:
+    return " ".join(unescape(_TAG_RE.sub(" ", text or "")).split())
+
+
+def parse_feed(data: bytes, source: str) -> List[Dict[str, Any]]:
+    """解析RSS 2.0或Atom，转换为与天行API相同字段的新闻列表"""
+    root = ET.fromstring(data)
+    newslist = []
+    if root.tag == f"{ATOM_NS}feed":
+        for entry in root.iter(f"{ATOM_NS}entry"):
+            link = ""
+            for element in entry.findall(f"{ATOM_NS}link"):
+                if element.get("rel", "alternate") == "alternate":
+                    link = element.get("href", "")
+                    break
+            newslist.append({
+                "title": _plain_text(entry.findtext(f"{ATOM_NS}title")),
+                "description": _plain_text(entry.findtext(f"{ATOM_NS}summary") or entry.findtext(f"{ATOM_NS}content")),
+                "url": link,
+                "ctime": parse_feed_time(entry.findtext(f"{ATOM_NS}published") or entry.findtext(f"{ATOM_NS}updated")),
+                "picUrl": "",
+                "source": source,
+            })
+        return newslist
+    for item in root.iter("item"):
+        enclosure = item.find("enclosure")
+        picture = ""
+        if enclosure is not None and enclosure.get("type", "").startswith("image/"):
+            picture = enclosure.get("url", "")
+        newslist.append({
+            "title": _plain_text(item.findtext("title")),
+            "description": _plain_text(item.findtext("description")),
+            "url": (item.findtext("link") or "").strip(),
+            "ctime": parse_feed_time(item.findtext("pubDate")),
+            "picUrl": picture,
+            "source": source,
+        })
+    return newslist
+
+
+class SourceStats:
+    __slots__ = ("requests", "errors", "timeouts", "items", "seconds", "last_seconds", "last_error")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.last_seconds = 0.0
+        self.last_error = ""
+
+    def as_dict(self) -> Dict[str, Any]:
+        completed = self.requests - self.timeouts
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "items": self.items,
+            "avg_seconds": self.seconds / completed if completed else 0.0,
+            "last_seconds": self.last_seconds,
+            "last_error": self.last_error,
+        }
+
+
+class NewsSource(ABC):
+    """新闻来源，fetch失败时抛出异常"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = SourceStats()
+
+    @abstractmethod
+    async def fetch(self, api_key: str, num: int) -> List[Dict[str, Any]]:
+        """获取最多num条新闻"""
+
+
+class TianApiSource(NewsSource):
+    """天行API的一个新闻分类接口"""
+
+    def __init__(self, name: str, client: NewsApiClient, endpoint: str):
+        super().__init__(name)
+        self.client = client
+        self.endpoint = endpoint
+
+    async def fetch(self, api_key: str, num: int) -> List[Dict[str, Any]]:
+        newslist = await self.client.fetch_news(self.endpoint, api_key, num)
+        if not newslist:
+            # 客户端已记录具体原因
+            raise RuntimeError("天行API未返回数据")
+        return newslist
+
+
+class FeedSource(NewsSource):
+    """RSS/Atom订阅，location为URL或本地文件路径"""
+
+    def __init__(self, name: str, client: NewsApiClient, location: str, timeout: float = 10):
+        super().__init__(name)
+        self.client = client
+        self.location = location
+        self.timeout = timeout
+
+    async def fetch(self, api_key: str, num: int) -> List[Dict[str, Any]]:
+        if self.location.startswith(("http://", "https://")):
+            data, _ = await self.client.get_bytes(self.location, self.timeout)
+        else:
+            data = await asyncio.get_running_loop().run_in_executor(None, self._read_file)
+        return parse_feed(data, self.name)[:num]
+
+    def _read_file(self) -> bytes:
+        with open(self.location, "rb") as f:
+            return f.read()
+
+
+class NewsAggregator:
+    """并发拉取多个来源，在总时限内合并结果：按链接和标题去重，按发布时间倒序排列
+
+    超过时限仍未返回的来源本次跳过，只有一个来源时不设时限。
+    """
+
+    def __init__(self, sources: Optional[List[NewsSource]] = None, deadline: float = 8):
+        self.sources: List[NewsSource] = list(sources or [])
+        self.deadline = deadline
+        self._stats: Dict[str, SourceStats] = {}
+
+    def configure(self, sources: List[NewsSource], deadline: float):
+        # 同名来源沿用之前的统计
+        for source in sources:
+            if source.name in self._stats:
+                source.stats = self._stats[source.name]
+            self._stats[source.name] = source.stats
+        self.sources = list(sources)
+        self.deadline = deadline
+
+    async def _fetch_source(self, source: NewsSource, api_key: str, num: int) -> List[Dict[str, Any]]:
+        stats = source.stats
+        stats.requests += 1
+        start = time.perf_counter()
+        try:
+            newslist = await source.fetch(api_key, num)
+        except asyncio.CancelledError:
+            stats.timeouts += 1
+            stats.last_error = "timeout"
+            raise
+        except Exception as e:
+            stats.errors += 1
+            stats.last_error = str(e) or e.__class__.__name__
+            logger.warning(f"[{self.__class__.__name__}] 来源{source.name}获取失败: {stats.last_error}")
+            newslist = []
+        stats.last_seconds = time.perf_counter() - start
+        stats.seconds += stats.last_seconds
+        stats.items += len(newslist)
+        return newslist
+
+    async def fetch(self, api_key: str, num: int) -> List[Dict[str, Any]]:
+        if not self.sources:
+            return []
+        if len(self.sources) == 1:
+            return (await self._fetch_source(self.sources[0], api_key, num))[:num]
+
+        tasks = [asyncio.create_task(self._fetch_source(source, api_key, num)) for source in self.sources]
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline if self.deadline > 0 else None)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            skipped = [source.name for source, task in zip(self.sources, tasks) if task in pending]
+            logger.warning(f"[{self.__class__.__name__}] 来源超过{self.deadline}秒未返回，本次跳过: {', '.join(skipped)}")
+        results = [task.result() for task in tasks if task in done]
+        return self.merge(results)[:num]
+
+    @staticmethod
+    def merge(results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """按链接或标题去重，保留先出现的来源，再按发布时间倒序稳定排序"""
+        seen = set()
+        merged = []
+        for newslist in results:
+            for news in newslist:
+                keys = []
+                if news.get("url"):
+                    keys.append(("url", normalize_url(news["url"])))
+                title = normalize_title(news.get("title") or "")
+                if title:
+                    keys.append(("title", title))
+                if not keys or any(key in seen for key in keys):
+                    continue
+                seen.update(keys)
+                merged.append(news)
+        merged.sort(key=lambda news: news.get("ctime") or "", reverse=True)
+        return merged
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {source.name: source.stats.as_dict() for source in self.sources}
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .news_sources import normalize_title, normalize_url
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    ctime TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    first_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_news_recency ON news (ctime DESC, id DESC);
+CREATE TABLE IF NOT EXISTS seen (
+    conversation_id TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+# 去重key的计算方式变化时加1，打开旧库时重新计算key
+KEY_VERSION = 1
+
+
+def news_key(item: Dict[str, Any]) -> str:
+    """新闻去重key：优先使用原文链接，没有链接时使用标题，与NewsAggregator.merge一样先做规范化"""
+    if item.get("url"):
+        value = normalize_url(str(item["url"]))
+    else:
+        value = normalize_title(str(item.get("title") or "")) or json.dumps(item, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+class NewsStore:
+    """本地新闻库：用SQLite保存API返回过的所有新闻，按链接去重，支持分页和按会话查询新增
+
+    方法都是同步的，单次查询都走索引，调用方可以放到线程池中执行。
+    """
+
+    def __init__(self, path: str, max_items: int = 5000):
+        self.path = path
+        self.max_items = max_items
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.inserted = 0
+
+    def configure(self, path: str, max_items: int):
+        if path != self.path:
+            self.close()
+            self.path = path
+        self.max_items = max_items
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._migrate_keys(conn)
+            self._conn = conn
+            logger.debug(f"[{self.__class__.__name__}] 已打开新闻库: {self.path}")
+        return self._conn
+
+    def _migrate_keys(self, conn: sqlite3.Connection):
+        """按当前规则重新计算旧库的key，规范化后重复的新闻只保留最早的一条"""
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= KEY_VERSION:
+            return
+        seen = set()
+        updates, duplicates = [], []
+        for row_id, data in conn.execute("SELECT id, data FROM news ORDER BY id").fetchall():
+            key = news_key(json.loads(data))
+            if key in seen:
+                duplicates.append((row_id,))
+            else:
+                seen.add(key)
+                updates.append((key, row_id))
+        with conn:
+            conn.executemany("DELETE FROM news WHERE id = ?", duplicates)
+            # 先改成临时值，避免新旧key互相冲突
+            conn.execute("UPDATE news SET key = 'migrating:' || id")
+            conn.executemany("UPDATE news SET key = ? WHERE id = ?", updates)
+            conn.execute(f"PRAGMA user_version = {KEY_VERSION}")
+        if duplicates:
+            logger.info(f"[{self.__class__.__name__}] 已合并{len(duplicates)}条重复新闻")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def merge(self, items: List[Dict[str, Any]]) -> int:
+        """写入新闻，已存在的跳过，返回新增条数"""
+        if not items:
+            return 0
+        now = time.time()
+        # API按时间倒序返回，倒过来写入使id顺序与发布时间一致
+        rows = [(news_key(item), str(item.get("ctime") or ""), json.dumps(item, ensure_ascii=False), now)
+                for item in reversed(items)]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                before = conn.total_changes
+                conn.executemany("INSERT OR IGNORE INTO news (key, ctime, data, first_seen) VALUES (?, ?, ?, ?)", rows)
+                inserted = conn.total_changes - before
+                if inserted and self.max_items > 0:
+                    self._prune(conn)
+        self.inserted += inserted
+        return inserted
+
+    def _prune(self, conn: sqlite3.Connection):
+        """只保留最新的max_items条"""
+        conn.execute(
+            "DELETE FROM news WHERE id IN (SELECT id FROM news ORDER BY ctime DESC, id DESC LIMIT -1 OFFSET ?)",
+            (self.max_items,),
+        )
+
+    def latest(self, limit: int, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """按发布时间倒序分页，返回(新闻, 读取时的最大id)"""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT data FROM news ORDER BY ctime DESC, id DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+            newest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM news").fetchone()[0]
+        return [json.loads(row[0]) for row in rows], newest
+
+    def since(self, conversation_id: str, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """会话上次查看之后新增的新闻，返回(新闻, 当前最大id)；从未查看过的会话返回最新的limit条"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT last_id FROM seen WHERE conversation_id = ?", (conversation_id,)).fetchone()
+            newest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM news").fetchone()[0]
+            if row is None:
+                rows = conn.execute("SELECT data FROM news ORDER BY ctime DESC, id DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                # 先按主键范围筛出新增的行，再按发布时间排序
+                rows = conn.execute(
+                    "SELECT data FROM news WHERE id > ? ORDER BY ctime DESC, id DESC LIMIT ?", (row[0], limit)
+                ).fetchall()
+        return [json.loads(row[0]) for row in rows], newest
+
+    def mark_seen(self, conversation_id: str, last_id: int):
+        """记录会话已看到的位置，last_id应取自读取新闻时返回的最大id"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO seen (conversation_id, last_id, updated_at) VALUES (?, ?, ?)",
+                    (conversation_id, last_id, time.time()),
+                )
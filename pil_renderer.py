@@ -0,0 +1,352 @@
+import base64
+import glob
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .image_encoder import encode, normalize_format
+from .template_engine import DESCRIPTION_LIMIT
+
+# 常见的中文字体位置，按顺序查找第一个存在的
+FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/wqy-microhei/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/wqy-zenhei/wqy-zenhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Medium.ttc",
+]
+
+# 与news_template.html保持一致的配色
+BODY_GRADIENT = ((0xd6, 0xce, 0xc2), (0xe6, 0xde, 0xd5))
+CARD_GRADIENT = ((0xf0, 0xec, 0xe6), (0xe8, 0xe4, 0xdb))
+HEADER_COLOR = (0x6d, 0x68, 0x75)
+TITLE_COLOR = (0x6d, 0x68, 0x75)
+DESCRIPTION_COLOR = (0x8e, 0x8d, 0x8a)
+CTIME_COLOR = (0x99, 0x99, 0x99)
+UNIT_BACKGROUND = (255, 255, 255)
+IMAGE_BORDER = (0xea, 0xe7, 0xdc)
+PLACEHOLDER_COLOR = (0xdc, 0xdc, 0xdc)
+
+
+def find_font(font_path: str = "", font_dir: str = "") -> Optional[str]:
+    """查找可用的中文字体：配置的路径 > 插件字体目录 > 系统字体"""
+    candidates = [font_path] if font_path else []
+    if font_dir and os.path.isdir(font_dir):
+        for pattern in ("*.ttc", "*.otf", "*.ttf"):
+            candidates.extend(sorted(glob.glob(os.path.join(font_dir, pattern))))
+    candidates.extend(FONT_CANDIDATES)
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def decode_data_uri(value: str) -> Optional[bytes]:
+    """解码base64形式的data URI，其他内容返回None"""
+    if not value or not value.startswith("data:"):
+        return None
+    header, _, payload = value.partition(",")
+    if not header.endswith(";base64") or "svg" in header:
+        return None
+    try:
+        return base64.b64decode(payload)
+    except ValueError:
+        return None
+
+
+class PillowRenderer:
+    """不依赖浏览器的轻量渲染器，用Pillow直接绘制与HTML模板相同布局的卡片"""
+
+    def __init__(self, width: int = 700, scale: float = 1.0, font_path: str = "", font_dir: str = "",
+                 qr_code_path: str = "", header: str = "今日AI快讯", footer: str = '备注"AI"加入AI交流群'):
+        self.width = width
+        self.scale = scale
+        self.font_path = font_path
+        self.font_dir = font_dir
+        self.qr_code_path = qr_code_path
+        self.header = header
+        self.footer = footer
+        self.image_format = "jpeg"
+        self.quality = 85
+        self.min_quality = 40
+        self.max_bytes = 0
+        self._fonts: Dict[int, Any] = {}
+        self._char_widths: Dict[int, Dict[str, float]] = {}
+        self._glyphs: Dict[Tuple[int, str], Tuple[Any, Tuple[int, int]]] = {}
+        self._resolved_font: Optional[str] = None
+        self._qr_code = None
+        self._qr_stamp = None
+        self._backgrounds: Dict[Tuple, Any] = {}
+        # 各阶段耗时回调(阶段名, 秒)，在线程池中调用
+        self.on_timing: Optional[Callable[[str, float], None]] = None
+        # 字体和各项缓存不是线程安全的，线程池中同一时间只绘制一张
+        self._lock = threading.Lock()
+
+    def configure(self, width: int, scale: float, font_path: str, font_dir: str):
+        if (width, scale, font_path, font_dir) != (self.width, self.scale, self.font_path, self.font_dir):
+            self.width, self.scale, self.font_path, self.font_dir = width, scale, font_path, font_dir
+            self._fonts.clear()
+            self._char_widths.clear()
+            self._glyphs.clear()
+            self._resolved_font = None
+            self._qr_code = None
+            self._backgrounds.clear()
+
+    def configure_output(self, image_format: str = "jpeg", quality: int = 85, min_quality: int = 40, max_bytes: int = 0):
+        self.image_format = normalize_format(image_format)
+        self.quality = quality
+        self.min_quality = min(min_quality, quality)
+        self.max_bytes = max_bytes
+
+    def _px(self, value: float) -> int:
+        return int(round(value * self.scale))
+
+    def _font(self, size: float):
+        from PIL import ImageFont
+
+        size = self._px(size)
+        font = self._fonts.get(size)
+        if font is None:
+            if self._resolved_font is None:
+                self._resolved_font = find_font(self.font_path, self.font_dir) or ""
+                if not self._resolved_font:
+                    logger.warning(f"[{self.__class__.__name__}] 未找到中文字体，中文可能无法显示，请在配置中设置font_path")
+            if self._resolved_font:
+                # 逐行绘制短文本，基础排版引擎比raqm快得多
+                font = ImageFont.truetype(self._resolved_font, size, layout_engine=ImageFont.Layout.BASIC)
+            else:
+                try:
+                    font = ImageFont.load_default(size)
+                except TypeError:  # Pillow < 10.1
+                    font = ImageFont.load_default()
+            self._fonts[size] = font
+        return font
+
+    def _gradient(self, size: Tuple[int, int], colors):
+        """上下渐变的背景，按尺寸缓存"""
+        from PIL import Image
+
+        key = (size, colors)
+        background = self._backgrounds.get(key)
+        if background is None:
+            top = Image.new("RGB", size, colors[0])
+            bottom = Image.new("RGB", size, colors[1])
+            mask = Image.linear_gradient("L").resize(size)
+            background = Image.composite(bottom, top, mask)
+            if len(self._backgrounds) > 16:
+                self._backgrounds.clear()
+            self._backgrounds[key] = background
+        return background.copy()
+
+    def _load_qr_code(self):
+        from PIL import Image
+
+        try:
+            stat = os.stat(self.qr_code_path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if self._qr_code is None or stamp != self._qr_stamp:
+            size = self._px(100)
+            with Image.open(self.qr_code_path) as image:
+                self._qr_code = image.convert("RGBA").resize((size, size))
+            self._qr_stamp = stamp
+        return self._qr_code
+
+    def _advance(self, font, char: str) -> float:
+        widths = self._char_widths.setdefault(id(font), {})
+        width = widths.get(char)
+        if width is None:
+            width = widths[char] = font.getlength(char)
+        return width
+
+    def _glyph(self, font, char: str):
+        """单个字符的灰度蒙版及其相对基准点的偏移，按字体缓存"""
+        from PIL import Image, ImageDraw
+
+        key = (id(font), char)
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            left, top, right, bottom = font.getbbox(char)
+            mask = None
+            if right > left and bottom > top:
+                mask = Image.new("L", (right - left, bottom - top), 0)
+                ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+            if len(self._glyphs) > 20000:
+                self._glyphs.clear()
+            glyph = self._glyphs[key] = (mask, (left, top))
+        return glyph
+
+    def _text_width(self, text: str, font) -> float:
+        return sum(self._advance(font, char) for char in text)
+
+    def _draw_text(self, canvas, xy: Tuple[float, float], text: str, font, fill, anchor: str = "la", bold: bool = False):
+        """逐字贴上缓存的字形，比每行调用ImageDraw.text快一个数量级；anchor支持la/ma/ra/mm"""
+        x, y = xy
+        if anchor[0] == "m":
+            x -= self._text_width(text, font) / 2
+        elif anchor[0] == "r":
+            x -= self._text_width(text, font)
+        if anchor[1] == "m":
+            ascent, descent = font.getmetrics()
+            y -= (ascent + descent) / 2
+        for char in text:
+            mask, (left, top) = self._glyph(font, char)
+            if mask is not None:
+                box = (int(round(x)) + left, int(round(y)) + top)
+                canvas.paste(fill, box, mask)
+                if bold:
+                    # 向右偏移1像素再贴一次，模拟粗体
+                    canvas.paste(fill, (box[0] + 1, box[1]), mask)
+            x += self._advance(font, char)
+
+    def _wrap(self, text: str, font, max_width: int) -> List[str]:
+        """按像素宽度逐字换行，适用于中英文混排；字符宽度按字体缓存"""
+        lines = []
+        current = []
+        current_width = 0.0
+        for char in text:
+            if char == "\n":
+                lines.append("".join(current))
+                current, current_width = [], 0.0
+                continue
+            width = self._advance(font, char)
+            if current and current_width + width > max_width:
+                lines.append("".join(current))
+                current, current_width = [], 0.0
+                if char.isspace():
+                    continue
+            current.append(char)
+            current_width += width
+        if current:
+            lines.append("".join(current))
+        return lines
+
+    def _thumbnail(self, value: str, size: Tuple[int, int]):
+        from PIL import Image, ImageOps
+
+        data = decode_data_uri(value)
+        if data:
+            try:
+                with Image.open(BytesIO(data)) as image:
+                    image.draft("RGB", size)  # JPEG可以直接按缩小尺寸解码
+                    return ImageOps.fit(image.convert("RGB"), size, method=Image.Resampling.BILINEAR)
+            except Exception as e:
+                logger.debug(f"[{self.__class__.__name__}] 解码配图失败: {e}")
+        return Image.new("RGB", size, PLACEHOLDER_COLOR)
+
+    def _layout_unit(self, news: Dict[str, Any], content_width: int) -> Dict[str, Any]:
+        text_width = content_width - self._px(40)
+        title_font, description_font = self._font(24), self._font(16)
+        description = str(news.get("description", "无描述"))
+        if len(description) > DESCRIPTION_LIMIT:
+            description = description[:DESCRIPTION_LIMIT] + "..."
+        unit = {
+            "title": self._wrap(str(news.get("title", "未知标题")), title_font, text_width),
+            "description": self._wrap(description, description_font, text_width),
+            "ctime": str(news.get("ctime", "未知时间")),
+            "picUrl": news.get("picUrl", ""),
+            "image_height": self._px(250),
+        }
+        unit["height"] = (
+            unit["image_height"] + self._px(2)
+            + self._px(20)
+            + len(unit["title"]) * self._px(32) + self._px(15)
+            + len(unit["description"]) * self._px(25.6) + self._px(15)
+            + self._px(20)
+            + self._px(20)
+        )
+        return unit
+
+    def render(self, newslist: List[Dict[str, Any]]) -> bytes:
+        """绘制卡片并按输出设置编码；配图需为data URI，其他值使用占位图"""
+        with self._lock:
+            return self._render(newslist)
+
+    def _render(self, newslist: List[Dict[str, Any]]) -> bytes:
+        from PIL import Image, ImageDraw
+
+        draw_start = time.perf_counter()
+        px = self._px
+        width = px(self.width)
+        padding = px(40)
+        card_width = width - padding * 2
+        card_padding = px(20)
+        content_width = card_width - card_padding * 2
+
+        header_font = self._font(64)
+        info_font = self._font(17.6)
+        units = [self._layout_unit(news, content_width) for news in newslist]
+        header_height = px(60) + px(80) + px(20) + px(4) + px(40)
+        news_height = px(20) * 2 + sum(unit["height"] + px(20) for unit in units) + (px(20) if units else 0)
+        qr_code = self._load_qr_code()
+        footer_height = px(20) * 2 + px(28) + px(10) + (qr_code.height if qr_code else 0)
+        card_height = card_padding * 2 + header_height + news_height + footer_height
+        height = card_height + padding * 2
+
+        canvas = self._gradient((width, height), BODY_GRADIENT)
+        card = self._gradient((card_width, card_height), CARD_GRADIENT)
+        card_mask = Image.new("L", (card_width, card_height), 0)
+        ImageDraw.Draw(card_mask).rounded_rectangle((0, 0, card_width - 1, card_height - 1), radius=px(10), fill=255)
+        canvas.paste(card, (padding, padding), card_mask)
+        draw = ImageDraw.Draw(canvas)
+
+        left = padding + card_padding
+        y = padding + card_padding + px(60)
+        self._draw_text(canvas, (width // 2, y + px(40)), self.header, header_font, HEADER_COLOR, anchor="mm", bold=True)
+        y += px(80) + px(20)
+        draw.rectangle(((width - px(200)) // 2, y, (width + px(200)) // 2 - 1, y + px(4) - 1), fill=HEADER_COLOR)
+        y += px(4) + px(40) + px(20)
+
+        for unit in units:
+            y += px(20)
+            box = (left, y, left + content_width - 1, y + unit["height"] - 1)
+            draw.rounded_rectangle(box, radius=px(8), fill=UNIT_BACKGROUND)
+            thumbnail = self._thumbnail(unit["picUrl"], (content_width, unit["image_height"]))
+            thumb_mask = Image.new("L", thumbnail.size, 0)
+            ImageDraw.Draw(thumb_mask).rounded_rectangle(
+                (0, 0, thumbnail.width - 1, thumbnail.height + px(8)), radius=px(8), fill=255)
+            canvas.paste(thumbnail, (left, y), thumb_mask)
+            text_y = y + unit["image_height"]
+            draw.rectangle((left, text_y, left + content_width - 1, text_y + px(2) - 1), fill=IMAGE_BORDER)
+            text_y += px(2) + px(20)
+            text_left = left + px(20)
+            for line in unit["title"]:
+                self._draw_text(canvas, (text_left, text_y), line, self._font(24), TITLE_COLOR, bold=True)
+                text_y += px(32)
+            text_y += px(15)
+            for line in unit["description"]:
+                self._draw_text(canvas, (text_left, text_y), line, self._font(16), DESCRIPTION_COLOR)
+                text_y += px(25.6)
+            text_y += px(15)
+            self._draw_text(canvas, (left + content_width - px(20), text_y), unit["ctime"], self._font(14.4), CTIME_COLOR, anchor="ra")
+            y += unit["height"]
+        if units:
+            y += px(20)
+        y += px(20)
+
+        y += px(20)
+        self._draw_text(canvas, (width // 2, y + px(14)), self.footer, info_font, HEADER_COLOR, anchor="mm")
+        y += px(28) + px(10)
+        if qr_code:
+            canvas.paste(qr_code, ((width - qr_code.width) // 2, y), qr_code)
+
+        self._record("pillow_draw", draw_start)
+        encode_start = time.perf_counter()
+        data = encode(canvas, self.image_format, self.quality, self.min_quality, self.max_bytes)
+        self._record("encode", encode_start)
+        return data
+
+    def _record(self, stage: str, start: float):
+        if self.on_timing is not None:
+            self.on_timing(stage, time.perf_counter() - start)
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenBucket:
+    """令牌桶：每秒补充rate个令牌，最多积累burst个"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        return self.tokens >= 1
+
+    def consume(self):
+        self.tokens -= 1
+
+    def try_acquire(self) -> bool:
+        if not self.available():
+            return False
+        self.consume()
+        return True
+
+    def retry_after(self) -> float:
+        """距离下一个令牌可用的秒数"""
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """按会话和全局两级限流，rate单位为次/分钟，0表示不限制"""
+
+    def __init__(self, conversation_rate: float = 3, conversation_burst: float = 2,
+                 global_rate: float = 30, global_burst: float = 10, max_conversations: int = 10000):
+        self.max_conversations = max_conversations
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # 会话被限流后，在该时间之前不再回复提示
+        self._notified: "OrderedDict[str, float]" = OrderedDict()
+        self.configure(conversation_rate, conversation_burst, global_rate, global_burst)
+        self.rejected = 0
+
+    def configure(self, conversation_rate: float, conversation_burst: float, global_rate: float, global_burst: float):
+        self.conversation_rate = conversation_rate
+        self.conversation_burst = conversation_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self._global = TokenBucket(global_rate / 60, global_burst) if global_rate > 0 else None
+        self._buckets.clear()
+        self._notified.clear()
+
+    def _bucket(self, conversation_id: str) -> Optional[TokenBucket]:
+        if self.conversation_rate <= 0:
+            return None
+        bucket = self._buckets.get(conversation_id)
+        if bucket is None:
+            bucket = TokenBucket(self.conversation_rate / 60, self.conversation_burst)
+            self._buckets[conversation_id] = bucket
+            if len(self._buckets) > self.max_conversations:
+                # 淘汰最久未使用的会话，它们的令牌桶早已补满
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(conversation_id)
+        return bucket
+
+    def allow(self, conversation_id: str) -> bool:
+        """会话和全局都有令牌时才放行，并各消耗一个"""
+        now = time.monotonic()
+        bucket = self._bucket(conversation_id)
+        if (bucket is not None and not bucket.available(now)) or (self._global is not None and not self._global.available(now)):
+            self.rejected += 1
+            return False
+        if bucket is not None:
+            bucket.consume()
+        if self._global is not None:
+            self._global.consume()
+        return True
+
+    def should_notify(self, conversation_id: str) -> bool:
+        """请求被拒绝后是否回复提示：同一会话在令牌补充之前只提示一次，之后的请求静默丢弃"""
+        now = time.monotonic()
+        until = self._notified.get(conversation_id)
+        if until is not None and now < until:
+            return False
+        bucket = self._buckets.get(conversation_id)
+        wait = max(bucket.retry_after() if bucket is not None else 0.0,
+                   self._global.retry_after() if self._global is not None else 0.0)
+        self._notified[conversation_id] = now + max(wait, 1.0)
+        self._notified.move_to_end(conversation_id)
+        if len(self._notified) > self.max_conversations:
+            self._notified.popitem(last=False)
+        return True
@@ -0,0 +1,584 @@
+import asyncio
+import json
+import os
+import struct
+import sys
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .render_worker import RenderQueueFull, RenderWorker, DEFAULT_BROWSER_ARGS, resolve_output_format
+
+# 消息格式：头部长度和数据长度(各4字节) + JSON头部 + 二进制数据
+_FRAME = struct.Struct(">II")
+# 工作进程连续启动失败后，等待一段时间再重新启动，避免反复崩溃
+RESTART_BACKOFF = 5
+# 父进程在工作进程自身超时的基础上多等待的时间，超过后认为进程已卡死
+TIMEOUT_MARGIN = 10
+STOP_TIMEOUT = 15
+
+
+def pack_message(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    data = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return _FRAME.pack(len(data), len(payload)) + data + payload
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """读取一条消息，连接关闭时返回None"""
+    try:
+        header_size, payload_size = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+        header = json.loads(await reader.readexactly(header_size))
+        payload = await reader.readexactly(payload_size) if payload_size else b""
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return header, payload
+
+
+def _read_exactly(stream, size: int) -> Optional[bytes]:
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _read_message_blocking(stream) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """工作进程用阻塞方式读取标准输入，各平台行为一致"""
+    prefix = _read_exactly(stream, _FRAME.size)
+    if prefix is None:
+        return None
+    header_size, payload_size = _FRAME.unpack(prefix)
+    header = _read_exactly(stream, header_size)
+    payload = _read_exactly(stream, payload_size) if payload_size else b""
+    if header is None or payload is None:
+        return None
+    return json.loads(header), payload
+
+
+def process_tree_rss(pid: int) -> int:
+    """进程及其所有子进程(Chromium)的常驻内存字节数，无法获取时返回0"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for child in processes:
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    # 没有psutil时读取/proc，只支持Linux
+    if not os.path.isdir("/proc"):
+        return 0
+    parents: Dict[int, int] = {}
+    rss: Dict[int, int] = {}
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                fields = f.read().rsplit(b")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents[int(entry)] = int(fields[1])
+        rss[int(entry)] = int(fields[21]) * page_size
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(child for child, parent in parents.items() if parent == current)
+    return total
+
+
+class _WorkerProcess:
+    """一个渲染工作进程及其在途任务"""
+    __slots__ = ("process", "futures", "active", "jobs", "ready", "retiring", "reader_task", "drain_lock", "started_at")
+
+    def __init__(self, process):
+        self.process = process
+        self.futures: Dict[int, asyncio.Future] = {}
+        self.active = 0
+        self.jobs = 0
+        self.ready = False
+        self.retiring = False
+        self.reader_task: Optional[asyncio.Task] = None
+        self.drain_lock = asyncio.Lock()
+        self.started_at = time.monotonic()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+
+class RenderService:
+    """进程外渲染：每个工作进程运行独立的RenderWorker和Chromium，通过标准输入输出通信
+
+    工作进程崩溃、内存超过max_rss_mb或完成max_jobs个任务后自动重启，浏览器卡死不会拖垮机器人进程。
+    接口与RenderWorker相同，可以直接替换。
+    """
+
+    def __init__(
+        self,
+        browser_args: Optional[List[str]] = None,
+        viewport: Optional[Dict[str, int]] = None,
+        concurrency: int = 2,
+        queue_size: int = 8,
+        job_timeout: float = 60,
+        page_max_uses: int = 50,
+        offline: bool = True,
+        font_dir: Optional[str] = None,
+        processes: int = 2,
+        max_rss_mb: float = 0,
+        max_jobs: int = 200,
+    ):
+        self.browser_args = list(browser_args or DEFAULT_BROWSER_ARGS)
+        self.viewport = dict(viewport or {"width": 700, "height": 1380})
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.job_timeout = job_timeout
+        self.page_max_uses = max(1, page_max_uses)
+        self.offline = offline
+        self.font_dir = font_dir
+        self.processes = max(1, processes)
+        self.max_rss_mb = max_rss_mb
+        self.max_jobs = max(0, max_jobs)
+
+        self.image_format = "png"
+        self.quality = 85
+        self.min_quality = 40
+        self.max_bytes = 0
+        self.scale = 1.0
+        self.clip_selector = ".card"
+        # 工作进程随回复带回各阶段耗时，在事件循环中回调(阶段名, 秒)
+        self.on_timing: Optional[Callable[[str, float], None]] = None
+
+        self._workers: List[_WorkerProcess] = []
+        self._spawn_tasks: set = set()
+        self._background: set = set()
+        self._waiters: List[asyncio.Future] = []
+        self._shell: Optional[str] = None
+        self._next_id = 0
+        self._pending = 0
+        self._retry_at = 0.0
+        self._closing = False
+        self._stopping = False
+        self.restarts = 0
+        self.recycled = 0
+        self.timeouts = 0
+
+    def configure(self, browser_args=None, viewport=None, concurrency=None, queue_size=None, job_timeout=None,
+                  page_max_uses=None, offline=None, font_dir=None):
+        """更新配置并同步到运行中的工作进程；浏览器参数在工作进程重启后生效"""
+        if browser_args is not None:
+            self.browser_args = list(browser_args)
+        if viewport is not None:
+            self.viewport = dict(viewport)
+        if concurrency is not None:
+            self.concurrency = max(1, concurrency)
+        if queue_size is not None:
+            self.queue_size = max(0, queue_size)
+        if job_timeout is not None:
+            self.job_timeout = job_timeout
+        if page_max_uses is not None:
+            self.page_max_uses = max(1, page_max_uses)
+        if offline is not None:
+            self.offline = offline
+        if font_dir is not None:
+            self.font_dir = font_dir
+        self._send_config()
+
+    def configure_output(self, image_format: str = "png", quality: int = 85, min_quality: int = 40, max_bytes: int = 0,
+                         scale: float = 1.0, clip_selector: str = ".card"):
+        self.image_format = resolve_output_format(image_format)
+        self.quality = quality
+        self.min_quality = min(min_quality, quality)
+        self.max_bytes = max_bytes
+        self.scale = scale
+        self.clip_selector = clip_selector
+        self._send_config()
+
+    def configure_pool(self, processes: int = 2, max_rss_mb: float = 0, max_jobs: int = 200):
+        """设置工作进程数和回收条件，max_rss_mb和max_jobs为0表示不限制"""
+        self.processes = max(1, processes)
+        self.max_rss_mb = max_rss_mb
+        self.max_jobs = max(0, max_jobs)
+
+    @property
+    def pending(self) -> int:
+        """排队中和渲染中的任务数"""
+        return self._pending
+
+    @property
+    def is_ready(self) -> bool:
+        return any(worker.ready for worker in self._workers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": [
+                {"pid": worker.pid, "active": worker.active, "jobs": worker.jobs,
+                 "uptime": time.monotonic() - worker.started_at}
+                for worker in self._workers
+            ],
+            "pending": self._pending,
+            "restarts": self.restarts,
+            "recycled": self.recycled,
+            "timeouts": self.timeouts,
+        }
+
+    async def start(self, shell: Optional[str] = None) -> bool:
+        """启动工作进程并等待至少一个就绪，并发调用共享同一批启动任务"""
+        if shell:
+            self._shell = shell
+        self._ensure_workers()
+        while not self.is_ready and self._spawn_tasks:
+            await asyncio.wait(set(self._spawn_tasks), return_when=asyncio.FIRST_COMPLETED)
+        return self.is_ready
+
+    async def render(self, shell: str, news_html: str) -> bytes:
+        """把渲染任务交给负载最低的工作进程，返回图片"""
+        if self._closing:
+            raise RuntimeError("渲染服务正在关闭")
+        if self._pending >= self.processes * self.concurrency + self.queue_size:
+            raise RenderQueueFull(f"渲染队列已满 ({self._pending})")
+        self._pending += 1
+        self._shell = shell
+        try:
+            worker = await asyncio.wait_for(self._acquire_worker(), timeout=self.job_timeout)
+            try:
+                return await self._submit(worker, shell, news_html)
+            finally:
+                await self._release_worker(worker)
+        finally:
+            self._pending -= 1
+            self._wake()
+
+    async def drain(self, timeout: float) -> bool:
+        """等待在途的渲染任务完成，期间不再接受新任务；超时返回False"""
+        self._closing = True
+        deadline = time.monotonic() + timeout
+        while self._pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"[{self.__class__.__name__}] 等待{self._pending}个渲染任务完成超时")
+                return False
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    async def stop(self, drain_timeout: float = 0):
+        """通知所有工作进程退出，超时未退出的直接结束；drain_timeout大于0时先等待在途任务完成"""
+        if drain_timeout > 0:
+            await self.drain(drain_timeout)
+        self._closing = False
+        self._stopping = True
+        try:
+            # 正在启动的进程会在启动完成后自行退出
+            await asyncio.gather(*self._spawn_tasks, return_exceptions=True)
+            workers, self._workers = self._workers, []
+            await asyncio.gather(*(self._stop_worker(worker) for worker in workers), return_exceptions=True)
+            # 等待回收中的进程完成在途任务后退出
+            await asyncio.gather(*self._background, return_exceptions=True)
+            self._wake()
+        finally:
+            self._stopping = False
+
+    # ---- 工作进程管理 ----
+
+    def _worker_config(self) -> Dict[str, Any]:
+        return {
+            "type": "configure",
+            "worker": {
+                "browser_args": self.browser_args, "viewport": self.viewport, "concurrency": self.concurrency,
+                "queue_size": 0, "job_timeout": self.job_timeout, "page_max_uses": self.page_max_uses,
+                "offline": self.offline, "font_dir": self.font_dir,
+            },
+            "output": {
+                "image_format": self.image_format, "quality": self.quality, "min_quality": self.min_quality,
+                "max_bytes": self.max_bytes, "scale": self.scale, "clip_selector": self.clip_selector,
+            },
+        }
+
+    def _send_config(self):
+        """配置消息很小，直接写入管道，不等待发送完成"""
+        if not self._workers:
+            return
+        message = pack_message(self._worker_config())
+        for worker in self._workers:
+            if worker.alive:
+                try:
+                    worker.process.stdin.write(message)
+                except (ConnectionError, RuntimeError) as e:
+                    logger.warning(f"[{self.__class__.__name__}] 同步配置到工作进程{worker.pid}失败: {e}")
+
+    def _ensure_workers(self):
+        """补足工作进程数量，启动在后台进行"""
+        if self._stopping:
+            return
+        missing = self.processes - len(self._workers) - len(self._spawn_tasks)
+        if missing <= 0 or time.monotonic() < self._retry_at:
+            return
+        for _ in range(missing):
+            task = asyncio.create_task(self._spawn())
+            self._spawn_tasks.add(task)
+            task.add_done_callback(self._on_spawn_done)
+
+    def _on_spawn_done(self, task: asyncio.Task):
+        self._spawn_tasks.discard(task)
+        self._wake()
+
+    def _command(self) -> Tuple[List[str], Dict[str, str], str]:
+        """以模块方式启动工作进程，PYTHONPATH指向插件所在的顶层目录"""
+        root = os.path.dirname(os.path.abspath(__file__))
+        for _ in __package__.split("."):
+            root = os.path.dirname(root)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+        return [sys.executable, "-m", f"{__package__}.render_service"], env, root
+
+    async def _spawn(self):
+        command, env, cwd = self._command()
+        start_time = time.time()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=env, cwd=cwd)
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] 启动渲染进程失败: {e}", exc_info=True)
+            self._retry_at = time.monotonic() + RESTART_BACKOFF
+            return
+
+        worker = _WorkerProcess(process)
+        worker.reader_task = asyncio.create_task(self._read_replies(worker))
+        try:
+            process.stdin.write(pack_message(self._worker_config()))
+            ready = await self._call(worker, {"type": "start", "shell": self._shell}, timeout=self.job_timeout + TIMEOUT_MARGIN)
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] 渲染进程{worker.pid}启动失败: {e}")
+            ready = False
+        if not ready or self._stopping:
+            self._retry_at = time.monotonic() + RESTART_BACKOFF
+            await self._stop_worker(worker)
+            return
+        worker.ready = True
+        self._retry_at = 0.0
+        self._workers.append(worker)
+        logger.success(f"[{self.__class__.__name__}] 渲染进程{worker.pid}已就绪，用时: {time.time() - start_time:.2f}秒")
+
+    async def _call(self, worker: _WorkerProcess, header: Dict[str, Any], timeout: float) -> Any:
+        """发送一条请求并等待对应的回复，返回(头部, 数据)中的结果"""
+        if worker.reader_task is None or worker.reader_task.done():
+            raise RuntimeError("渲染进程已退出")
+        self._next_id += 1
+        header = dict(header, id=self._next_id)
+        future = asyncio.get_running_loop().create_future()
+        worker.futures[self._next_id] = future
+        try:
+            worker.process.stdin.write(pack_message(header))
+            async with worker.drain_lock:
+                await worker.process.stdin.drain()
+            reply, payload = await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            worker.futures.pop(header["id"], None)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error") or "渲染进程返回错误")
+        return payload if header["type"] == "render" else reply.get("ok")
+
+    async def _read_replies(self, worker: _WorkerProcess):
+        while True:
+            message = await read_message(worker.process.stdout)
+            if message is None:
+                break
+            reply, payload = message
+            if self.on_timing is not None:
+                for stage, seconds in reply.get("timings") or ():
+                    self.on_timing(stage, seconds)
+            future = worker.futures.get(reply.get("id"))
+            if future is not None and not future.done():
+                future.set_result((reply, payload))
+
+        returncode = await worker.process.wait()
+        for future in worker.futures.values():
+            if not future.done():
+                future.set_exception(RuntimeError(f"渲染进程已退出 (returncode={returncode})"))
+        if worker in self._workers:
+            self._workers.remove(worker)
+            if not worker.retiring and not self._stopping:
+                self.restarts += 1
+                logger.warning(f"[{self.__class__.__name__}] 渲染进程{worker.pid}异常退出 (returncode={returncode})，正在重启")
+                self._ensure_workers()
+        self._wake()
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _acquire_worker(self) -> _WorkerProcess:
+        """选择在途任务最少的工作进程；都满载时排队等待"""
+        while True:
+            self._ensure_workers()
+            candidates = [worker for worker in self._workers
+                          if worker.ready and not worker.retiring and worker.alive and worker.active < self.concurrency]
+            if candidates:
+                worker = min(candidates, key=lambda w: (w.active, w.jobs))
+                worker.active += 1
+                return worker
+            if not self._workers and not self._spawn_tasks:
+                raise RuntimeError("渲染进程不可用")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    async def _submit(self, worker: _WorkerProcess, shell: str, news_html: str) -> bytes:
+        try:
+            return await self._call(worker, {"type": "render", "shell": shell, "html": news_html},
+                                    timeout=self.job_timeout + TIMEOUT_MARGIN)
+        except asyncio.TimeoutError:
+            # 工作进程内部的超时没有生效，说明浏览器已经卡死
+            self.timeouts += 1
+            logger.error(f"[{self.__class__.__name__}] 渲染进程{worker.pid}超时未响应，结束该进程")
+            self._retire(worker, kill=True)
+            raise
+
+    async def _release_worker(self, worker: _WorkerProcess):
+        worker.active -= 1
+        worker.jobs += 1
+        if not worker.retiring and worker.alive:
+            reason = None
+            if self.max_jobs and worker.jobs >= self.max_jobs:
+                reason = f"已完成{worker.jobs}个任务"
+            elif self.max_rss_mb > 0:
+                rss = await asyncio.get_running_loop().run_in_executor(None, process_tree_rss, worker.pid)
+                if rss > self.max_rss_mb * 1024 * 1024:
+                    reason = f"内存占用{rss / 1024 / 1024:.0f}MB"
+            if reason:
+                logger.info(f"[{self.__class__.__name__}] 渲染进程{worker.pid}{reason}，回收重启")
+                self.recycled += 1
+                self._retire(worker)
+        self._wake()
+
+    def _retire(self, worker: _WorkerProcess, kill: bool = False):
+        """不再分配新任务，在途任务完成后退出，同时在后台启动替代进程"""
+        if worker.retiring:
+            if kill and worker.alive:
+                worker.process.kill()
+            return
+        worker.retiring = True
+        if worker in self._workers:
+            self._workers.remove(worker)
+        if kill and worker.alive:
+            worker.process.kill()
+        task = asyncio.create_task(self._stop_worker(worker, wait_idle=True))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        self._ensure_workers()
+
+    async def _stop_worker(self, worker: _WorkerProcess, wait_idle: bool = False):
+        worker.retiring = True
+        try:
+            if wait_idle:
+                while worker.active and worker.alive:
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._waiters.append(waiter)
+                    await waiter
+            if worker.alive:
+                try:
+                    worker.process.stdin.write(pack_message({"type": "stop"}))
+                    worker.process.stdin.close()
+                except (ConnectionError, RuntimeError):
+                    pass
+                try:
+                    await asyncio.wait_for(worker.process.wait(), timeout=STOP_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.warning(f"[{self.__class__.__name__}] 渲染进程{worker.pid}未能正常退出，强制结束")
+                    worker.process.kill()
+                    await worker.process.wait()
+        finally:
+            if worker.reader_task is not None:
+                await asyncio.gather(worker.reader_task, return_exceptions=True)
+        logger.debug(f"[{self.__class__.__name__}] 渲染进程{worker.pid}已退出")
+
+
+# ---- 以下代码运行在工作进程中 ----
+
+async def _serve(stdin, stdout):
+    """工作进程主循环：读取请求，交给进程内的RenderWorker处理并写回结果"""
+    loop = asyncio.get_running_loop()
+    worker = RenderWorker()
+    tasks = set()
+    timings: "deque[Tuple[str, float]]" = deque()
+    # 耗时在渲染线程中记录，随下一条回复一起发送
+    worker.on_timing = lambda stage, seconds: timings.append((stage, seconds))
+
+    def reply(header: Dict[str, Any], payload: bytes = b""):
+        if timings:
+            header["timings"] = [timings.popleft() for _ in range(len(timings))]
+        stdout.write(pack_message(header, payload))
+        stdout.flush()
+
+    async def handle(request: Dict[str, Any]):
+        try:
+            shell = request.get("shell")
+            ready = await worker.start(shell)
+            if request["type"] == "start":
+                reply({"id": request["id"], "ok": ready, "error": None if ready else "浏览器启动失败"})
+                return
+            if not ready:
+                raise RuntimeError("浏览器启动失败")
+            data = await worker.render(shell, request["html"])
+            reply({"id": request["id"], "ok": True}, data)
+        except Exception as e:
+            reply({"id": request["id"], "ok": False, "error": f"{e.__class__.__name__}: {e}"})
+
+    while True:
+        message = await loop.run_in_executor(None, _read_message_blocking, stdin)
+        if message is None or message[0].get("type") == "stop":
+            break
+        request = message[0]
+        if request["type"] == "configure":
+            worker.configure(**request["worker"])
+            worker.configure_output(**request["output"])
+            continue
+        task = asyncio.create_task(handle(request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await worker.stop()
+
+
+def main():
+    # 标准输出专门用于传输结果，其他输出(包括Chromium)一律改到标准错误
+    stdout = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    try:
+        asyncio.run(_serve(sys.stdin.buffer, stdout))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
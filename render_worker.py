@@ -0,0 +1,575 @@
+import asyncio
+import mimetypes
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from .image_encoder import QUALITY_STEP, normalize_format, pillow_available, quality_steps, reencode
+from .template_engine import NEWS_PLACEHOLDER
+
+DEFAULT_BROWSER_ARGS = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-gpu']
+FONT_HOSTS = ('fonts.googleapis.com', 'fonts.gstatic.com')
+FONT_STYLESHEET = 'fonts.css'
+NEWS_CONTAINER_SELECTOR = '.news-container'
+# 调用方在job_timeout之外多等待的时间，渲染线程卡死无法自行超时时兜底
+JOB_TIMEOUT_MARGIN = 5
+# 浏览器启动失败后的冷却时间(秒)，期间直接返回失败，调用方可以立即回退
+START_BACKOFF = 5
+
+# 把新闻单元写入容器并等待图片和字体加载完成；模板中没有容器时返回false
+_INJECT_SCRIPT = """
+async ([selector, html]) => {
+    const container = document.querySelector(selector);
+    if (!container) return false;
+    container.innerHTML = html;
+    await Promise.all(Array.from(container.querySelectorAll('img')).map(img =>
+        img.complete ? null : new Promise(resolve => { img.onload = img.onerror = resolve; })));
+    await document.fonts.ready;
+    return true;
+}
+"""
+_RESET_SCRIPT = """
+(selector) => {
+    const container = document.querySelector(selector);
+    if (container) container.innerHTML = '';
+}
+"""
+
+
+def resolve_output_format(image_format: str) -> str:
+    """截图输出格式：Chromium只支持png和jpeg，webp需要Pillow重新编码"""
+    image_format = normalize_format(image_format)
+    if image_format == "webp" and not pillow_available():
+        logger.warning("[RenderWorker] 未安装Pillow，无法输出WebP，改用JPEG")
+        image_format = "jpeg"
+    return image_format
+
+
+class RenderQueueFull(Exception):
+    """渲染队列已满"""
+
+
+class _PooledPage:
+    """池中的页面，记录已加载的模板外壳和使用次数"""
+    __slots__ = ("page", "shell_key", "uses", "profile")
+
+    def __init__(self, page, profile):
+        self.page = page
+        self.shell_key = None
+        self.uses = 0
+        self.profile = profile
+
+
+class RenderWorker:
+    """常驻渲染线程：在插件生命周期内独占一个事件循环、一个Playwright实例和一个Chromium浏览器"""
+
+    def __init__(
+        self,
+        browser_args: Optional[List[str]] = None,
+        viewport: Optional[Dict[str, int]] = None,
+        concurrency: int = 2,
+        queue_size: int = 8,
+        job_timeout: float = 60,
+        page_max_uses: int = 50,
+        offline: bool = True,
+        font_dir: Optional[str] = None,
+    ):
+        self.browser_args = list(browser_args or DEFAULT_BROWSER_ARGS)
+        self.viewport = dict(viewport or {"width": 700, "height": 1380})
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.job_timeout = job_timeout
+        self.page_max_uses = max(1, page_max_uses)
+        self.offline = offline
+        self.font_dir = font_dir
+
+        # 截图输出设置
+        self.image_format = "png"
+        self.quality = 85
+        self.min_quality = 40
+        self.max_bytes = 0
+        self.scale = 1.0
+        self.clip_selector = ".card"
+        # 各阶段耗时回调(阶段名, 秒)，在渲染线程中调用
+        self.on_timing: Optional[Callable[[str, float], None]] = None
+
+        # 以下属性只在插件的事件循环中访问，无需加锁
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready = None
+        self._retry_at = 0.0
+        self._pending = 0
+        self._closing = False
+        self._idle_waiters: List[asyncio.Future] = []
+
+        # 以下属性只在渲染线程的事件循环中访问
+        self._playwright = None
+        self._browser = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_size = 0
+        self._idle_pages: List[_PooledPage] = []
+        self._background: set = set()
+        self._font_files: Dict[str, Optional[Tuple[bytes, str]]] = {}
+        # (外壳hash, 占位符之前, 占位符之后)，整页加载时直接拼接
+        self._shell_parts: Optional[Tuple[int, str, str]] = None
+
+    def configure(self, browser_args=None, viewport=None, concurrency=None, queue_size=None, job_timeout=None,
+                  page_max_uses=None, offline=None, font_dir=None):
+        """更新配置；浏览器参数在下次启动浏览器时生效"""
+        if browser_args is not None:
+            self.browser_args = list(browser_args)
+        if viewport is not None:
+            self.viewport = dict(viewport)
+        if concurrency is not None:
+            self.concurrency = max(1, concurrency)
+        if queue_size is not None:
+            self.queue_size = max(0, queue_size)
+        if job_timeout is not None:
+            self.job_timeout = job_timeout
+        if page_max_uses is not None:
+            self.page_max_uses = max(1, page_max_uses)
+        if offline is not None:
+            self.offline = offline
+        if font_dir is not None and font_dir != self.font_dir:
+            self.font_dir = font_dir
+            self._font_files = {}
+
+    def configure_output(self, image_format: str = "png", quality: int = 85, min_quality: int = 40, max_bytes: int = 0,
+                         scale: float = 1.0, clip_selector: str = ".card"):
+        """设置截图格式、质量、缩放比例和裁剪区域；max_bytes大于0时逐级降低质量直到图片不超过该大小"""
+        self.image_format = resolve_output_format(image_format)
+        self.quality = quality
+        self.min_quality = min(min_quality, quality)
+        self.max_bytes = max_bytes
+        self.scale = scale
+        self.clip_selector = clip_selector
+
+    @property
+    def pending(self) -> int:
+        """排队中和渲染中的任务数"""
+        return self._pending
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready is not None and self._ready.done() and not self._ready.cancelled() \
+            and self._ready.exception() is None and self._ready.result()
+
+    async def start(self, shell: Optional[str] = None) -> bool:
+        """启动渲染线程并等待浏览器就绪；并发调用在同一个启动future上等待，不会因为正在启动而失败
+
+        传入shell时预先创建页面池。检查和创建future之间没有await，同一事件循环中不需要加锁。
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, name="AIReport-render", daemon=True)
+            self._thread.start()
+            self._ready = None
+        if self._ready is None or (self._ready.done() and not self.is_ready):
+            if self._ready is not None and time.monotonic() < self._retry_at:
+                logger.debug(f"[{self.__class__.__name__}] 浏览器启动失败后的冷却期内，暂不重新启动")
+                return False
+            # 首次启动或上次启动失败时重新启动浏览器
+            self._ready = asyncio.run_coroutine_threadsafe(self._start(shell), self._loop)
+        ready = self._ready
+        try:
+            # shield：某个调用方被取消时不影响其他等待者和启动本身
+            started = await asyncio.shield(asyncio.wrap_future(ready))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] 启动渲染线程失败: {e}", exc_info=True)
+            started = False
+        if not started:
+            self._retry_at = time.monotonic() + START_BACKOFF
+        return started
+
+    async def render(self, shell: str, news_html: str) -> bytes:
+        """提交渲染任务：在已加载shell的页面中填入news_html并截图，返回PNG"""
+        if self._loop is None:
+            raise RuntimeError("渲染线程未启动")
+        if self._closing:
+            raise RuntimeError("渲染线程正在关闭")
+        if self._pending >= self.concurrency + self.queue_size:
+            raise RenderQueueFull(f"渲染队列已满 ({self._pending})")
+        self._pending += 1
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._render(shell, news_html), self._loop)
+            # 超时后取消渲染线程中的任务
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.job_timeout + JOB_TIMEOUT_MARGIN)
+        finally:
+            self._pending -= 1
+            if not self._pending:
+                self._wake_idle()
+
+    def _wake_idle(self):
+        waiters, self._idle_waiters = self._idle_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self, timeout: float) -> bool:
+        """等待在途的渲染任务完成，期间不再接受新任务；超时返回False"""
+        if not self._pending:
+            return True
+        self._closing = True
+        waiter = asyncio.get_running_loop().create_future()
+        self._idle_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"[{self.__class__.__name__}] 等待{self._pending}个渲染任务完成超时")
+            return False
+
+    async def stop(self, drain_timeout: float = 0):
+        """关闭浏览器并停止渲染线程；drain_timeout大于0时先等待在途任务完成"""
+        if drain_timeout > 0:
+            await self.drain(drain_timeout)
+        loop, thread = self._loop, self._thread
+        self._loop = None
+        self._thread = None
+        self._ready = None
+        self._closing = False
+        if loop is None or thread is None:
+            return
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(), loop)
+            await asyncio.wait_for(asyncio.wrap_future(future), timeout=30)
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] 关闭浏览器失败: {e}")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            await asyncio.get_running_loop().run_in_executor(None, thread.join, 10)
+            # 锁和信号量绑定在旧的事件循环上，重启时需要重新创建
+            self._launch_lock = None
+            self._slots = None
+
+    # ---- 以下方法运行在渲染线程中 ----
+
+    def _record(self, stage: str, start: float):
+        if self.on_timing is not None:
+            try:
+                self.on_timing(stage, time.perf_counter() - start)
+            except Exception as e:
+                logger.debug(f"[{self.__class__.__name__}] 记录耗时失败: {e}")
+
+    def _run_loop(self):
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            try:
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            finally:
+                loop.close()
+                logger.debug(f"[{self.__class__.__name__}] 渲染线程事件循环已关闭")
+
+    async def _start(self, shell: Optional[str]) -> bool:
+        if not await self._launch():
+            return False
+        if shell:
+            try:
+                await self._prewarm(shell)
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] 预热页面池失败: {e}")
+        return True
+
+    async def _launch(self) -> bool:
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return True
+
+            # 这里才真正导入playwright，避免启动时加载
+            try:
+                from playwright.async_api import async_playwright
+            except ImportError as imp_err:
+                logger.error(f"[{self.__class__.__name__}] 导入playwright模块失败: {imp_err}")
+                return False
+
+            logger.info(f"[{self.__class__.__name__}] 正在初始化Playwright...")
+            start_time = time.time()
+            try:
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                    logger.debug(f"[{self.__class__.__name__}] async_playwright().start() 完成，用时: {time.time() - start_time:.2f}秒")
+            except NotImplementedError as nie:
+                logger.error(f"[{self.__class__.__name__}] Playwright初始化失败 (NotImplementedError - 可能是Anaconda环境问题): {nie}")
+                return False
+            except Exception as start_err:
+                logger.error(f"[{self.__class__.__name__}] Playwright启动失败: {start_err}", exc_info=True)
+                return False
+
+            try:
+                browser_start = time.time()
+                launch_start = time.perf_counter()
+                self._browser = await self._playwright.chromium.launch(args=self.browser_args, headless=True)
+                self._record("browser_launch", launch_start)
+                logger.debug(f"[{self.__class__.__name__}] Chromium浏览器启动完成，用时: {time.time() - browser_start:.2f}秒")
+            except Exception as browser_err:
+                logger.error(f"[{self.__class__.__name__}] 启动Chromium浏览器失败: {browser_err}", exc_info=True)
+                await self._shutdown()
+                return False
+
+            logger.success(f"[{self.__class__.__name__}] Playwright初始化成功，总用时: {time.time() - start_time:.2f}秒")
+            return True
+
+    async def _render(self, shell: str, news_html: str) -> bytes:
+        # 浏览器意外退出时自动重启
+        if self._browser is None or not self._browser.is_connected():
+            if self._browser is not None:
+                logger.warning(f"[{self.__class__.__name__}] 浏览器连接已断开，正在重新启动")
+                self._browser = None
+                self._idle_pages.clear()
+            if not await self._launch():
+                raise RuntimeError("浏览器启动失败")
+        # 排队、获取页面和截图都计入job_timeout，浏览器卡住时请求不会一直挂起
+        return await asyncio.wait_for(self._run_job(shell, news_html), timeout=self.job_timeout)
+
+    def _job_slots(self) -> asyncio.Semaphore:
+        """并发数变化后重建信号量；已在执行的任务仍释放到旧信号量，切换期间并发可能短暂超出"""
+        if self._slots is None or self._slots_size != self.concurrency:
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._slots_size = self.concurrency
+        return self._slots
+
+    async def _run_job(self, shell: str, news_html: str) -> bytes:
+        async with self._job_slots():
+            setup_start = time.perf_counter()
+            pooled = await self._acquire_page(shell)
+            self._record("page_setup", setup_start)
+            try:
+                data = await self._screenshot(pooled, shell, news_html)
+            except BaseException:
+                # 出错的页面状态不可信，直接丢弃
+                await self._close_page(pooled)
+                raise
+            await self._release_page(pooled, shell)
+            return data
+
+    async def _screenshot(self, pooled: _PooledPage, shell: str, news_html: str) -> bytes:
+        page = pooled.page
+        load_start = time.perf_counter()
+        injected = await page.evaluate(_INJECT_SCRIPT, [NEWS_CONTAINER_SELECTOR, news_html])
+        if not injected:
+            # 自定义模板中没有新闻容器时，退回到整页加载
+            pooled.shell_key = None
+            await page.set_content(self._fill_shell(shell, news_html), timeout=self.job_timeout * 1000)
+            await page.wait_for_load_state(self._load_state, timeout=self.job_timeout * 1000)
+        self._record("content_load", load_start)
+        return await self._capture(page)
+
+    def _fill_shell(self, shell: str, news_html: str) -> str:
+        """外壳按占位符切分一次后缓存，之后只拼接片段，不对整个文档做替换"""
+        key = hash(shell)
+        if self._shell_parts is None or self._shell_parts[0] != key:
+            prefix, _, suffix = shell.partition(NEWS_PLACEHOLDER)
+            self._shell_parts = (key, prefix, suffix)
+        _, prefix, suffix = self._shell_parts
+        return "".join((prefix, news_html, suffix))
+
+    async def _capture(self, page) -> bytes:
+        """按输出设置截图：裁剪到clip_selector元素，必要时逐级降低质量"""
+        capture_start = time.perf_counter()
+        target, options = page, {"full_page": True}
+        if self.clip_selector:
+            element = await page.query_selector(self.clip_selector)
+            if element is not None:
+                target, options = element, {}
+
+        if self.image_format == "webp":
+            # Chromium截图不支持WebP，先截PNG再用Pillow编码
+            png = await target.screenshot(type="png", **options)
+            self._record("screenshot", capture_start)
+            encode_start = time.perf_counter()
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, reencode, png, "webp", self.quality, self.min_quality, self.max_bytes)
+            self._record("encode", encode_start)
+            return data
+
+        # JPEG和PNG由Chromium在截图时编码，encode阶段只记录JPEG截图之后的压缩处理
+        if self.image_format == "png":
+            data = await target.screenshot(type="png", **options)
+            self._record("screenshot", capture_start)
+            return data
+
+        data = await target.screenshot(type="jpeg", quality=self.quality, **options)
+        self._record("screenshot", capture_start)
+        encode_start = time.perf_counter()
+        try:
+            return await self._limit_jpeg(target, options, data)
+        finally:
+            self._record("encode", encode_start)
+
+    async def _limit_jpeg(self, target, options: Dict, data: bytes) -> bytes:
+        """JPEG超过max_bytes时逐级降低质量"""
+        if not self.max_bytes or len(data) <= self.max_bytes or self.quality <= self.min_quality:
+            return data
+        lower = max(self.min_quality, self.quality - QUALITY_STEP)
+        logger.debug(f"[{self.__class__.__name__}] 图片大小{len(data)}超过上限，从quality={lower}开始降低质量")
+        if pillow_available():
+            # 只截图一次，用Pillow对截图逐级降低质量重新编码
+            return await asyncio.get_running_loop().run_in_executor(
+                None, reencode, data, "jpeg", lower, self.min_quality, self.max_bytes)
+        # 没有Pillow时只能由Chromium按较低质量重新截图
+        for quality in quality_steps(lower, self.min_quality):
+            data = await target.screenshot(type="jpeg", quality=quality, **options)
+            if len(data) <= self.max_bytes:
+                break
+        return data
+
+    async def _new_page(self, shell: str) -> _PooledPage:
+        pooled = _PooledPage(
+            await self._browser.new_page(viewport=self.viewport, device_scale_factor=self.scale),
+            self._page_profile,
+        )
+        await pooled.page.route("**/*", self._route_request)
+        await self._load_shell(pooled, shell)
+        return pooled
+
+    @property
+    def _page_profile(self):
+        """创建页面时确定、之后无法修改的设置，变化后需要重建页面"""
+        return (self.viewport.get("width"), self.viewport.get("height"), self.scale)
+
+    @property
+    def _load_state(self) -> str:
+        # 离线模式下所有请求都在本地完成，无需等待网络空闲
+        return "load" if self.offline else "networkidle"
+
+    async def _route_request(self, route):
+        """字体请求优先由本地目录提供；离线模式下拦截其余所有网络请求"""
+        url = route.request.url
+        if url.startswith(("data:", "about:", "blob:")):
+            await route.continue_()
+            return
+        parts = urlsplit(url)
+        if parts.hostname in FONT_HOSTS:
+            asset = self._font_asset(parts.hostname, parts.path)
+            if asset is not None:
+                body, content_type = asset
+                await route.fulfill(status=200, body=body, content_type=content_type,
+                                    headers={"Access-Control-Allow-Origin": "*"})
+            elif not self.offline:
+                # 没有本地字体且允许联网时照常从Google Fonts加载
+                await route.continue_()
+            elif parts.hostname == FONT_HOSTS[0]:
+                # 没有本地字体时返回空样式表，使用系统字体
+                await route.fulfill(status=200, body="", content_type="text/css")
+            else:
+                await route.abort()
+            return
+        if self.offline:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _font_asset(self, host: str, path: str) -> Optional[Tuple[bytes, str]]:
+        """样式表请求对应font_dir/fonts.css，字体文件按文件名在font_dir中查找"""
+        if not self.font_dir:
+            return None
+        name = FONT_STYLESHEET if host == FONT_HOSTS[0] and path.startswith("/css") else os.path.basename(path)
+        if name not in self._font_files:
+            asset = None
+            file_path = os.path.join(self.font_dir, name)
+            if name and os.path.isfile(file_path):
+                with open(file_path, "rb") as f:
+                    content_type = mimetypes.guess_type(name)[0] or ("font/" + name.rsplit(".", 1)[-1])
+                    asset = (f.read(), content_type)
+            else:
+                logger.debug(f"[{self.__class__.__name__}] 本地字体文件不存在: {file_path}")
+            self._font_files[name] = asset
+        return self._font_files[name]
+
+    async def _load_shell(self, pooled: _PooledPage, shell: str):
+        await pooled.page.set_content(shell, timeout=self.job_timeout * 1000)
+        await pooled.page.wait_for_load_state(self._load_state, timeout=self.job_timeout * 1000)
+        pooled.shell_key = hash(shell)
+
+    async def _is_healthy(self, pooled: _PooledPage) -> bool:
+        if pooled.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(pooled.page.evaluate("1"), timeout=2)
+            return True
+        except Exception:
+            return False
+
+    async def _acquire_page(self, shell: str) -> _PooledPage:
+        """从池中取出健康的页面，没有可用页面时新建"""
+        while self._idle_pages:
+            pooled = self._idle_pages.pop()
+            if pooled.profile != self._page_profile:
+                await self._close_page(pooled)
+                continue
+            if not await self._is_healthy(pooled):
+                logger.warning(f"[{self.__class__.__name__}] 丢弃不可用的页面")
+                await self._close_page(pooled)
+                continue
+            if pooled.shell_key != hash(shell):
+                await self._load_shell(pooled, shell)
+            return pooled
+        return await self._new_page(shell)
+
+    async def _release_page(self, pooled: _PooledPage, shell: str):
+        """重置页面后放回池中，达到使用次数上限时回收并在后台补充新页面"""
+        pooled.uses += 1
+        if pooled.uses >= self.page_max_uses:
+            await self._close_page(pooled)
+            task = asyncio.create_task(self._prewarm(shell, count=1))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            return
+        try:
+            await pooled.page.evaluate(_RESET_SCRIPT, NEWS_CONTAINER_SELECTOR)
+        except Exception as e:
+            logger.warning(f"[{self.__class__.__name__}] 重置页面失败，丢弃页面: {e}")
+            await self._close_page(pooled)
+            return
+        self._idle_pages.append(pooled)
+
+    async def _prewarm(self, shell: str, count: Optional[int] = None):
+        """预先创建加载好模板外壳的页面"""
+        count = self.concurrency - len(self._idle_pages) if count is None else count
+        for _ in range(count):
+            if len(self._idle_pages) >= self.concurrency or self._browser is None:
+                return
+            self._idle_pages.append(await self._new_page(shell))
+        logger.debug(f"[{self.__class__.__name__}] 页面池已就绪，空闲页面数: {len(self._idle_pages)}")
+
+    async def _close_page(self, pooled: _PooledPage):
+        try:
+            await pooled.page.close()
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] 关闭页面失败: {e}")
+
+    async def _shutdown(self):
+        for task in list(self._background):
+            task.cancel()
+        self._idle_pages.clear()
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+                logger.debug(f"[{self.__class__.__name__}] Playwright浏览器已关闭")
+            except Exception as e:
+                logger.error(f"[{self.__class__.__name__}] 关闭浏览器失败: {e}")
+            finally:
+                self._browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+                logger.debug(f"[{self.__class__.__name__}] Playwright实例已停止")
+            except Exception as e:
+                logger.error(f"[{self.__class__.__name__}] 停止Playwright实例失败: {e}")
+            finally:
+                self._playwright = None
@@ -0,0 +1,82 @@
+import asyncio
+import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger
+
+
+def parse_times(times: List[str]) -> List[datetime.time]:
+    """解析"HH:MM"格式的时间列表，忽略格式错误的项"""
+    parsed = []
+    for value in times:
+        try:
+            hour, minute = str(value).split(":")
+            parsed.append(datetime.time(int(hour), int(minute)))
+        except ValueError:
+            logger.warning(f"[DailyScheduler] 忽略格式错误的时间: {value}")
+    return sorted(set(parsed))
+
+
+class DailyScheduler:
+    """每天在固定时间点执行异步任务的后台调度器"""
+
+    def __init__(self, job: Callable[[], Awaitable[None]], times: Optional[List[str]] = None):
+        self.job = job
+        self.times = parse_times(times or [])
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, times: List[str]):
+        """更新执行时间，已在等待中的调度会在下一轮使用新时间"""
+        self.times = parse_times(times)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在当前事件循环中启动调度，立即返回"""
+        if self.running or not self.times:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"[{self.__class__.__name__}] 定时任务已启动，执行时间: {', '.join(t.strftime('%H:%M') for t in self.times)}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info(f"[{self.__class__.__name__}] 定时任务已停止")
+
+    def next_run(self, now: Optional[datetime.datetime] = None) -> Optional[datetime.datetime]:
+        if not self.times:
+            return None
+        now = now or datetime.datetime.now()
+        for day in (0, 1):
+            date = now.date() + datetime.timedelta(days=day)
+            for run_time in self.times:
+                candidate = datetime.datetime.combine(date, run_time)
+                if candidate > now:
+                    return candidate
+        return None
+
+    async def _run(self):
+        while True:
+            next_run = self.next_run()
+            if next_run is None:
+                return
+            delay = (next_run - datetime.datetime.now()).total_seconds()
+            logger.debug(f"[{self.__class__.__name__}] 下次执行时间: {next_run:%Y-%m-%d %H:%M}")
+            await asyncio.sleep(max(0.0, delay))
+            if datetime.datetime.now() < next_run:
+                # 系统时间被调整导致提前醒来，重新计算
+                continue
+            try:
+                await self.job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{self.__class__.__name__}] 定时任务执行失败: {e}", exc_info=True)
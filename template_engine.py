@@ -0,0 +1,136 @@
+import base64
+import os
+import re
+from html import escape
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+NEWS_PLACEHOLDER = '<!-- NEWS_CONTENT -->'
+QR_CODE_PLACEHOLDER = 'QRcode.png'
+DESCRIPTION_LIMIT = 100
+
+NEWS_UNIT_TEMPLATE = '''
+            <div class="news-unit">
+                <img src="{picUrl}" alt="news image">
+                <div class="text-block">
+                    <div class="title">{title}</div>
+                    <div class="description">{description}</div>
+                    <div class="ctime">{ctime}</div>
+                </div>
+            </div>'''
+
+_FIELD_PATTERN = re.compile(r"\{(\w+)\}")
+
+
+def compile_fragments(source: str) -> Tuple[List[str], List[str]]:
+    """把带{field}占位符的片段拆成字面量列表和字段名列表，literals比fields多一个"""
+    literals = []
+    fields = []
+    pos = 0
+    for match in _FIELD_PATTERN.finditer(source):
+        literals.append(source[pos:match.start()])
+        fields.append(match.group(1))
+        pos = match.end()
+    literals.append(source[pos:])
+    return literals, fields
+
+
+class NewsTemplate:
+    """预编译的新闻模板：模板和二维码只在文件变化时重新读取，渲染只需一次join"""
+
+    def __init__(self, template_path: str, qr_code_path: str, unit_template: str = NEWS_UNIT_TEMPLATE):
+        self.template_path = template_path
+        self.qr_code_path = qr_code_path
+        self._unit_literals, self._unit_fields = compile_fragments(unit_template)
+        self._stamp: Optional[Tuple] = None
+        self._shell = ""
+        self._prefix = ""
+        self._suffix = ""
+
+    def invalidate(self):
+        """丢弃已编译的模板，下次渲染时重新加载"""
+        self._stamp = None
+
+    def _file_stamp(self) -> Tuple:
+        stamp = []
+        for path in (self.template_path, self.qr_code_path):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _ensure_loaded(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        self._load()
+        self._stamp = stamp
+
+    def _load(self):
+        self._shell = self._prefix = self._suffix = ""
+        if not os.path.exists(self.template_path):
+            logger.error(f"[{self.__class__.__name__}] HTML模板文件未找到: {self.template_path}")
+            return
+
+        with open(self.template_path, 'r', encoding='utf-8') as f:
+            template = f.read()
+
+        # 读取QR码图片并编码为Base64
+        if os.path.exists(self.qr_code_path):
+            try:
+                with open(self.qr_code_path, 'rb') as image_file:
+                    encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
+                template = template.replace(QR_CODE_PLACEHOLDER, f"data:image/png;base64,{encoded_string}")
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] 读取二维码图片失败: {e}")
+
+        self._shell = template
+        self._prefix, sep, self._suffix = template.partition(NEWS_PLACEHOLDER)
+        if not sep:
+            logger.warning(f"[{self.__class__.__name__}] 模板中缺少 {NEWS_PLACEHOLDER} 占位符，新闻内容将追加到末尾")
+        logger.debug(f"[{self.__class__.__name__}] 已加载HTML模板: {self.template_path}")
+
+    @property
+    def version(self) -> str:
+        """模板和二维码文件的版本标识"""
+        return repr(self._file_stamp())
+
+    def shell(self) -> str:
+        """不含新闻内容的模板外壳"""
+        self._ensure_loaded()
+        return self._shell
+
+    def _unit_parts(self, newslist: List[Dict[str, Any]]) -> List[str]:
+        literals, fields = self._unit_literals, self._unit_fields
+        parts = []
+        for news_item in newslist:
+            values = {
+                'title': news_item.get('title', '未知标题'),
+                'description': news_item.get('description', '无描述'),
+                'ctime': news_item.get('ctime', '未知时间'),
+                'picUrl': news_item.get('picUrl', ''),
+            }
+            if len(values['description']) > DESCRIPTION_LIMIT:
+                values['description'] = values['description'][:DESCRIPTION_LIMIT] + '...'
+            for literal, field in zip(literals, fields):
+                parts.append(literal)
+                parts.append(escape(str(values.get(field, news_item.get(field, '')))))
+            parts.append(literals[-1])
+        return parts
+
+    def render_units(self, newslist: List[Dict[str, Any]]) -> str:
+        """渲染新闻单元HTML片段，字段均做HTML转义"""
+        return "".join(self._unit_parts(newslist))
+
+    def render(self, newslist: List[Dict[str, Any]]) -> str:
+        """渲染完整HTML，模板加载失败时返回空字符串"""
+        self._ensure_loaded()
+        if not self._shell:
+            return ""
+        parts = [self._prefix]
+        parts.extend(self._unit_parts(newslist))
+        parts.append(self._suffix)
+        return "".join(parts)